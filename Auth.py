@@ -1,13 +1,33 @@
-import sqlite3
+import base64
 import hashlib
+import hmac
+import os
 import random
 import string
-import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pool import ConnectionPool
+
+# -------------- Auth DB Connection --------------
+# One persistent WAL connection to data/auth.db, leased per call from a
+# single-slot pool (see pool.py), instead of a fresh connect per function.
+AUTH_DB = "data/auth.db"
+_pool = ConnectionPool(max_size=1)
+_initialized = set()
+
+def _connect():
+    # Keyed by absolute path: a process that changes directory gets the new file
+    path = os.path.abspath(AUTH_DB)
+    if path not in _initialized:
+        initialize_auth_db()
+    return _pool.connect(path)
 
 # -------------- Init Auth DB --------------
 def initialize_auth_db():
-    os.makedirs("data", exist_ok=True)
-    conn = sqlite3.connect("data/auth.db")
+    path = os.path.abspath(AUTH_DB)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = _pool.connect(path)
     c = conn.cursor()
     c.execute("""
         CREATE TABLE IF NOT EXISTS users (
@@ -17,89 +37,140 @@ def initialize_auth_db():
     """)
     conn.commit()
     conn.close()
+    _initialized.add(path)
+
+def close():
+    _pool.close_all()
+    _initialized.clear()
 
 # -------------- Password Hashing --------------
+# Stored as "<algorithm>$<k=v,...>$<salt>$<hash>" (salt and hash in base64), so
+# every user keeps the parameters they were hashed with. After a successful
+# login the password is rehashed if those differ from HASH_SCHEME; rows from the
+# old scheme (bare unsalted SHA-256 hex) are upgraded the same way.
+# Hashing is slow on purpose, so it runs on a small worker pool: a burst of
+# logins waits its turn there (up to MAX_PENDING at once, then AuthBusy) instead
+# of every Streamlit session thread burning CPU on it together.
+HASH_SCHEME = ("scrypt", {"n": 2 ** 15, "r": 8, "p": 1})
+HASH_WORKERS = max(1, min(4, os.cpu_count() or 1))
+MAX_PENDING = 64
+HASH_TIMEOUT = 30.0  # seconds a caller waits for a worker slot
+SALT_BYTES = 16
+
+class AuthBusy(RuntimeError):
+    pass
+
+def _kdf(algorithm, params, password, salt):
+    if algorithm == "scrypt":
+        n, r, p = params["n"], params["r"], params["p"]
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r, dklen=32)
+    if algorithm == "pbkdf2_sha256":
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, params["iterations"])
+    raise ValueError(f"Unknown password hash algorithm: {algorithm!r}")
+
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="auth-hash")
+_slots = threading.BoundedSemaphore(MAX_PENDING)
+
+def configure_hashing(algorithm=None, params=None, workers=None, max_pending=None):
+    # New hashes (and rehash-on-login) use the scheme set here
+    global HASH_SCHEME, HASH_WORKERS, MAX_PENDING, _executor, _slots
+    if algorithm is not None:
+        HASH_SCHEME = (algorithm, dict(params or {}))
+    if workers is not None and workers != HASH_WORKERS:
+        HASH_WORKERS = workers
+        _executor.shutdown(wait=True)
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="auth-hash")
+    if max_pending is not None and max_pending != MAX_PENDING:
+        MAX_PENDING = max_pending
+        _slots = threading.BoundedSemaphore(max_pending)
+
+def _run_kdf(algorithm, params, password, salt):
+    # Blocks the calling session until a worker has hashed; raises AuthBusy
+    # when MAX_PENDING hashes are already queued or running for HASH_TIMEOUT
+    slots = _slots
+    if not slots.acquire(timeout=HASH_TIMEOUT):
+        raise AuthBusy("Too many logins in progress; try again shortly.")
+    try:
+        return _executor.submit(_kdf, algorithm, params, password, salt).result()
+    finally:
+        slots.release()
+
+def _encode(algorithm, params, salt, digest):
+    fields = ",".join(f"{k}={v}" for k, v in sorted(params.items()))
+    return "$".join([algorithm, fields, base64.b64encode(salt).decode(), base64.b64encode(digest).decode()])
+
+def _decode(stored):
+    # -> (algorithm, params, salt, digest); the legacy scheme has no salt or params
+    if "$" not in stored:
+        return "sha256", {}, b"", bytes.fromhex(stored)
+    algorithm, fields, salt, digest = stored.split("$")
+    params = {k: int(v) for k, v in (f.split("=") for f in fields.split(",") if f)}
+    return algorithm, params, base64.b64decode(salt), base64.b64decode(digest)
+
 def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+    algorithm, params = HASH_SCHEME
+    salt = os.urandom(SALT_BYTES)
+    return _encode(algorithm, params, salt, _run_kdf(algorithm, params, password, salt))
+
+def _check(stored, password):
+    algorithm, params, salt, digest = _decode(stored)
+    if algorithm == "sha256":
+        candidate = hashlib.sha256(password.encode()).digest()
+    else:
+        candidate = _run_kdf(algorithm, params, password, salt)
+    return hmac.compare_digest(candidate, digest)
+
+def needs_rehash(stored):
+    algorithm, params, _, _ = _decode(stored)
+    return (algorithm, params) != HASH_SCHEME
 
 # -------------- Register User --------------
 def add_user(username, password):
-    conn = sqlite3.connect("data/auth.db")
-    c = conn.cursor()
-    c.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, hash_password(password)))
-    conn.commit()
-    conn.close()
+    hashed = hash_password(password)
+    conn = _connect()
+    try:
+        conn.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, hashed))
+        conn.commit()
+    finally:
+        conn.close()
 
 # -------------- Verify Login --------------
 def verify_user(username, password):
-    conn = sqlite3.connect("data/auth.db")
-    c = conn.cursor()
-    c.execute("SELECT password FROM users WHERE username=?", (username,))
-    row = c.fetchone()
+    conn = _connect()
+    row = conn.execute("SELECT password FROM users WHERE username=?", (username,)).fetchone()
     conn.close()
-    return row and row[0] == hash_password(password)
+    if not row or not row[0]:
+        # Spend a real user's hashing time so timing does not reveal who exists
+        algorithm, params = HASH_SCHEME
+        _run_kdf(algorithm, params, password, bytes(SALT_BYTES))
+        return False
+    stored = row[0]
+    if not _check(stored, password):
+        return False
+    if needs_rehash(stored):
+        upgraded = hash_password(password)
+        conn = _connect()
+        # Only if the password was not changed in the meantime
+        conn.execute("UPDATE users SET password=? WHERE username=? AND password=?", (upgraded, username, stored))
+        conn.commit()
+        conn.close()
+    return True
 
 # -------------- Forgot Password - Reset with Temp --------------
 def reset_password(username):
-    conn = sqlite3.connect("data/auth.db")
-    c = conn.cursor()
-    c.execute("SELECT * FROM users WHERE username=?", (username,))
-    if c.fetchone():
-        temp_password = ''.join(random.choices(string.ascii_letters + string.digits, k=8))
-        c.execute("UPDATE users SET password=? WHERE username=?", (hash_password(temp_password), username))
-        conn.commit()
-        conn.close()
-        return temp_password
+    conn = _connect()
+    exists = conn.execute("SELECT 1 FROM users WHERE username=?", (username,)).fetchone()
     conn.close()
-    return None
+    if not exists:
+        return None
+    temp_password = ''.join(random.choices(string.ascii_letters + string.digits, k=8))
+    update_password(username, temp_password)
+    return temp_password
 
 # -------------- Change Password --------------
 def update_password(username, new_password):
-    conn = sqlite3.connect("data/auth.db")
-    c = conn.cursor()
-    c.execute("UPDATE users SET password=? WHERE username=?", (hash_password(new_password), username))
+    hashed = hash_password(new_password)
+    conn = _connect()
+    conn.execute("UPDATE users SET password=? WHERE username=?", (hashed, username))
     conn.commit()
     conn.close()
-
-# -------------- Streamlit Login Section --------------
-import streamlit as st
-from db import create_user_db
-
-def login_section():
-    initialize_auth_db()
-
-    st.title("🔐 Login")
-
-    tab1, tab2, tab3 = st.tabs(["Login", "Register", "Forgot Password"])
-
-    with tab1:
-        username = st.text_input("Username", key="login_user")
-        password = st.text_input("Password", type="password", key="login_pass")
-        if st.button("Login"):
-            if verify_user(username, password):
-                st.session_state.username = username
-                st.success("Login successful!")
-                create_user_db(username)
-                st.rerun()
-            else:
-                st.error("Invalid credentials.")
-
-    with tab2:
-        new_user = st.text_input("New Username", key="register_user")
-        new_pass = st.text_input("New Password", type="password", key="register_pass")
-        if st.button("Register"):
-            try:
-                add_user(new_user, new_pass)
-                create_user_db(new_user)
-                st.success("Registration successful! Please login.")
-            except sqlite3.IntegrityError:
-                st.error("Username already exists.")
-
-    with tab3:
-        forgot_user = st.text_input("Username", key="forgot_user")
-        if st.button("Reset Password"):
-            temp = reset_password(forgot_user)
-            if temp:
-                st.warning(f"Temporary password: `{temp}`")
-            else:
-                st.error("Username not found.")
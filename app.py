@@ -1,16 +1,78 @@
 import streamlit as st
 import pandas as pd
 from db import (
-    add_record, get_records, set_goal, get_goal, log_goal_history, get_goal_history,
-    get_total_income, get_total_expenses,
-    get_streak, get_best_streak, get_streak_growth,
-    add_recurring_transaction, get_recurring_transactions, process_due_recurring_transactions,
-    get_base_currency, set_base_currency,
-    unlock_achievement, get_achievements,
-    get_monthly_spending_by_category
+    add_record, get_records, records_cursor, count_records, search_records, SEARCH_WINDOW, set_goal, log_goal_history,
+    add_recurring_transaction, process_due_recurring_transactions,
+    get_base_currency, set_base_currency, create_user_db,
 )
-from Auth import login_section
-from datetime import date
+import Auth
+from importer import import_records, read_csv_header
+import scheduler
+from forecast import forecast_next_month
+import loader
+import profiling
+from profiling import profiler
+import numpy as np
+import os
+import sqlite3
+from datetime import date, timedelta
+
+# Usernames allowed to see the Profiling page, e.g. EXPENSE_TRACKER_ADMINS=alice,bob
+ADMINS = {u.strip() for u in os.environ.get("EXPENSE_TRACKER_ADMINS", "").split(",") if u.strip()}
+
+# Goal chart ranges: label -> days back from today (None = all history)
+CHART_RANGES = {"Last 90 days": 90, "Last year": 365, "Last 3 years": 3 * 365, "All time": None}
+
+# -------------- Login --------------
+def login_section():
+    Auth.initialize_auth_db()
+
+    st.title("🔐 Login")
+
+    tab1, tab2, tab3 = st.tabs(["Login", "Register", "Forgot Password"])
+
+    with tab1:
+        username = st.text_input("Username", key="login_user")
+        password = st.text_input("Password", type="password", key="login_pass")
+        if st.button("Login"):
+            try:
+                ok = Auth.verify_user(username, password)
+            except Auth.AuthBusy as exc:
+                st.warning(str(exc))
+                ok = None
+            if ok:
+                st.session_state.username = username
+                st.success("Login successful!")
+                create_user_db(username)
+                st.rerun()
+            elif ok is not None:
+                st.error("Invalid credentials.")
+
+    with tab2:
+        new_user = st.text_input("New Username", key="register_user")
+        new_pass = st.text_input("New Password", type="password", key="register_pass")
+        if st.button("Register"):
+            try:
+                Auth.add_user(new_user, new_pass)
+                create_user_db(new_user)
+                st.success("Registration successful! Please login.")
+            except sqlite3.IntegrityError:
+                st.error("Username already exists.")
+            except Auth.AuthBusy as exc:
+                st.warning(str(exc))
+
+    with tab3:
+        forgot_user = st.text_input("Username", key="forgot_user")
+        if st.button("Reset Password"):
+            try:
+                temp = Auth.reset_password(forgot_user)
+            except Auth.AuthBusy as exc:
+                st.warning(str(exc))
+            else:
+                if temp:
+                    st.warning(f"Temporary password: `{temp}`")
+                else:
+                    st.error("Username not found.")
 
 # -------------- Logout --------------
 def logout():
@@ -21,17 +83,15 @@ def logout():
 # -------------- Dashboard --------------
 def dashboard(username):
     st.subheader("📊 Dashboard")
-    process_due_recurring_transactions(username)
 
-    income = get_total_income(username)
-    expenses = get_total_expenses(username)
-    savings = income - expenses
-    base = get_base_currency(username)
+    snap = loader.dashboard(username)
 
     col1, col2, col3 = st.columns(3)
-    col1.metric("Total Income", f"{base} {income}")
-    col2.metric("Total Expenses", f"{base} {expenses}")
-    col3.metric("Current Savings", f"{base} {savings}")
+    col1.metric("Total Income", f"{snap.base} {snap.income}")
+    col2.metric("Total Expenses", f"{snap.base} {snap.expenses}")
+    col3.metric("Current Savings", f"{snap.base} {snap.savings}")
+    if snap.unconverted:
+        st.warning(f"Records in {', '.join(snap.unconverted)} are left out: no exchange rate is loaded for them.")
 
 # -------------- Records Section --------------
 def record_section(username):
@@ -47,57 +107,196 @@ def record_section(username):
         desc = st.text_input("Description")
 
     if st.button("Add Record"):
-        add_record(username, category, amount, rtype, desc, currency)
-        st.success("Record added!")
+        try:
+            add_record(username, category, amount, rtype, desc, currency)
+        except ValueError as exc:
+            st.error(str(exc))
+        else:
+            st.success("Record added!")
 
     st.subheader("📋 Your Records")
-    df = get_records(username)
-    if not df.empty:
-        st.dataframe(df)
+    query = st.text_input("Search", key="rec_search", placeholder="Description or category, e.g. netflix or [Recurring] rent")
+    with st.expander("🔎 Filters"):
+        fcol1, fcol2 = st.columns(2)
+        with fcol1:
+            start = st.date_input("From", value=None, key="rec_from")
+            end = st.date_input("To", value=None, key="rec_to")
+            page_size = st.selectbox("Rows per page", [25, 50, 100, 250], index=1, key="rec_page_size")
+        with fcol2:
+            f_category = st.selectbox("Category", ["All", "Food", "Travel", "Shopping", "Bills", "Other"], key="rec_f_cat")
+            f_type = st.selectbox("Type", ["All", "Income", "Expense"], key="rec_f_type")
+            f_currency = st.selectbox("Currency", ["All", "INR", "USD", "EUR", "GBP"], key="rec_f_cur")
+    filters = {
+        "start_date": start.isoformat() if start else None,
+        "end_date": end.isoformat() if end else None,
+        "category": None if f_category == "All" else f_category,
+        "record_type": None if f_type == "All" else f_type,
+        "currency": None if f_currency == "All" else f_currency,
+    }
+
+    if query.strip():
+        search_results(username, query, filters, page_size)
+        return
+
+    # Keyset paging: keep the cursor of every page visited so "Previous" is free
+    state_key = (tuple(filters.items()), page_size)
+    if st.session_state.get("rec_state_key") != state_key:
+        st.session_state.rec_state_key = state_key
+        st.session_state.rec_cursors = [None]
+    cursors = st.session_state.rec_cursors
+
+    total = count_records(username, **filters)
+    pages = max(1, -(-total // page_size))
+    page = get_records(username, page_size=page_size, cursor=cursors[-1], **filters)
+    if not page.empty:
+        st.dataframe(page, hide_index=True)
+    else:
+        st.info("No records match these filters.")
+
+    pcol1, pcol2, pcol3 = st.columns([1, 2, 1])
+    with pcol1:
+        if st.button("◀ Previous", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+    pcol2.caption(f"Page {len(cursors)} of {pages} · {total:,} records")
+    with pcol3:
+        if st.button("Next ▶", disabled=len(cursors) >= pages):
+            cursors.append(records_cursor(page))
+            st.rerun()
+
+def search_results(username, query, filters, page_size):
+    # Best matches first; pages are offsets into the ranked list
+    state_key = (query, tuple(filters.items()), page_size)
+    if st.session_state.get("search_state_key") != state_key:
+        st.session_state.search_state_key = state_key
+        st.session_state.search_page = 0
+    page_no = st.session_state.search_page
+    results = search_records(username, query, filters, limit=page_size, offset=page_no * page_size)
+    if not results.empty:
+        st.dataframe(results.drop(columns="rank"), hide_index=True)
+    else:
+        st.info("No records match this search.")
+
+    # Only the newest SEARCH_WINDOW matches are ranked, so paging stops there
+    capped = len(results) == page_size and (page_no + 1) * page_size >= SEARCH_WINDOW
+    if capped:
+        st.caption(f"Showing the best of the newest {SEARCH_WINDOW:,} matches. "
+                   "Add words or a date filter to reach older records.")
+
+    pcol1, pcol2, pcol3 = st.columns([1, 2, 1])
+    with pcol1:
+        if st.button("◀ Previous", disabled=page_no == 0, key="search_prev"):
+            st.session_state.search_page -= 1
+            st.rerun()
+    pcol2.caption(f"Page {page_no + 1} · best matches first")
+    with pcol3:
+        if st.button("Next ▶", disabled=len(results) < page_size or capped, key="search_next"):
+            st.session_state.search_page += 1
+            st.rerun()
+
+# -------------- Import Statements --------------
+def import_section(username):
+    st.subheader("📥 Import Bank Statement")
+
+    upload = st.file_uploader("Statement file", type=["csv", "ofx", "qfx"])
+    if upload is None:
+        st.info("Upload a CSV or OFX statement exported from your bank.")
+        return
+
+    fmt = "csv" if upload.name.lower().endswith(".csv") else "ofx"
+    mapping, date_format = None, None
+    if fmt == "csv":
+        columns = ["—"] + read_csv_header(upload)
+        st.caption("Map statement columns to record fields")
+        col1, col2 = st.columns(2)
+        mapping = {}
+        for i, field in enumerate(["date", "amount", "description", "category", "type", "currency"]):
+            with (col1 if i % 2 == 0 else col2):
+                guess = next((c for c in columns if c.lower() == field), "—")
+                choice = st.selectbox(field.title(), columns, index=columns.index(guess), key=f"import_{field}")
+                mapping[field] = None if choice == "—" else choice
+        date_format = st.text_input("Date format (blank = auto-detect)", value="", key="import_date_format") or None
+
+    currency = st.selectbox("Default currency", ["INR", "USD", "EUR", "GBP"], key="import_currency")
+
+    if st.button("Import"):
+        if fmt == "csv" and not (mapping["date"] and mapping["amount"]):
+            st.error("Date and Amount columns are required.")
+            return
+        status = st.empty()
+        stats = import_records(
+            username, upload, fmt=fmt, mapping=mapping, date_format=date_format,
+            defaults={"currency": currency},
+            progress=lambda s: status.write(f"Imported {s['inserted']:,} rows so far..."),
+        )
+        status.empty()
+        st.success(
+            f"Imported {stats['inserted']:,} of {stats['rows']:,} rows "
+            f"({stats['duplicates']:,} duplicates, {stats['skipped']:,} unreadable) "
+            f"at {stats['rows_per_sec']:,.0f} rows/sec."
+        )
 
 # -------------- Goals and Streaks --------------
 def goal_section(username):
     st.subheader("🎯 Monthly Goal")
 
-    current = get_goal(username)
-    new_goal = st.number_input("Set Monthly Goal", value=float(current), min_value=0.0)
+    span = st.selectbox("Chart range", list(CHART_RANGES), key="goal_chart_range")
+    days = CHART_RANGES[span]
+    start = (date.today() - timedelta(days=days)).isoformat() if days else None
+
+    snap = loader.goals(username, start)
+    new_goal = st.number_input("Set Monthly Goal", value=float(snap.goal), min_value=0.0)
 
     if st.button("Update Goal"):
         set_goal(username, new_goal)
         log_goal_history(username, new_goal)
-        unlock_achievement(username, "First Goal Set")
         st.success("Goal updated!")
+        snap = loader.goals(username, start)
 
     st.subheader("📈 Goal History")
-    history = get_goal_history(username)
-    if not history.empty:
-        st.line_chart(history.set_index("date")["goal"])
+    if not snap.history.empty:
+        st.line_chart(snap.history.set_index("date")["goal"])
 
     # Streak Tracking
     st.subheader("🔥 Streak Tracker")
-    streak = get_streak(username)
-    best = get_best_streak(username)
-
-    if streak >= 7:
-        unlock_achievement(username, "7-Day Streak")
+    streak, best = snap.streak, snap.best
 
     col1, col2 = st.columns(2)
     col1.metric("Current Streak", f"{streak} days")
     col2.metric("Best Streak", f"{best} days")
 
-    growth = get_streak_growth(username)
-    if not growth.empty:
-        st.line_chart(growth.set_index("Date")["Streak"])
+    if not snap.growth.empty:
+        st.line_chart(snap.growth.set_index("Date")["Streak"])
 
 # -------------- Budget Prediction --------------
 def budget_prediction(username):
     st.subheader("📊 Budget Prediction")
 
-    data = get_monthly_spending_by_category(username)
-    if not data.empty:
-        st.bar_chart(data)
-    else:
+    snap = loader.prediction(username, months=12)
+    history, base, goal = snap.history, snap.base, snap.goal
+    # The last row is the month in progress: fit on the closed months before it
+    closed = history.iloc[:-1]
+    if closed.empty or not closed.to_numpy().any():
         st.info("Not enough data for prediction yet.")
+        return
+
+    st.bar_chart(history.tail(6))
+
+    prediction = forecast_next_month(closed, horizon=2)
+    total = float(prediction["forecast"].sum())
+
+    col1, col2 = st.columns(2)
+    col1.metric("Forecast spend next month", f"{base} {total:,.2f}",
+                delta=f"{total - float(closed.iloc[-1].sum()):,.2f} vs last month", delta_color="inverse")
+    if goal:
+        col2.metric("Monthly goal", f"{base} {goal:,.2f}",
+                    delta=f"{goal - total:,.2f} headroom", delta_color="normal")
+        if total > goal:
+            st.warning("Forecast spending is above your monthly goal.")
+
+    st.caption("Per-category forecast with ~95% prediction interval")
+    st.dataframe(prediction, use_container_width=True)
+    st.bar_chart(prediction[["last", "forecast"]])
 
 # -------------- Recurring Transactions --------------
 def recurring_section(username):
@@ -116,11 +315,17 @@ def recurring_section(username):
             currency = st.selectbox("Currency", ["INR", "USD", "EUR", "GBP"], key="rec_currency")
 
         if st.button("Add Recurring"):
-            add_recurring_transaction(username, category, amount, rtype, desc, freq, start_date.isoformat(), currency)
-            st.success("Recurring transaction added!")
+            try:
+                add_recurring_transaction(username, category, amount, rtype, desc, freq, start_date.isoformat(), currency)
+            except ValueError as exc:
+                st.error(str(exc))
+            else:
+                # Back-dated rules catch up straight away instead of waiting for the scheduler
+                process_due_recurring_transactions(username)
+                st.success("Recurring transaction added!")
 
     st.subheader("📅 Upcoming Recurring Entries")
-    rec = get_recurring_transactions(username)
+    rec = loader.recurring(username).rules
     if not rec.empty:
         st.dataframe(rec)
     else:
@@ -130,11 +335,8 @@ def recurring_section(username):
 def achievements_section(username):
     st.subheader("🏅 Achievements")
 
-    income = get_total_income(username)
-    if income >= 10000:
-        unlock_achievement(username, "Saved ₹10,000")
-
-    badges = get_achievements(username)
+    # Badges are unlocked by the writes that earn them (db.ACHIEVEMENTS)
+    badges = loader.achievements(username).badges
     if badges.empty:
         st.info("No achievements unlocked yet.")
     else:
@@ -150,26 +352,71 @@ def sidebar(username):
         set_base_currency(username, new_currency)
         st.experimental_rerun()
 
-    return st.sidebar.radio("📂 Navigation", ["Dashboard", "Add Record", "Goals", "Recurring", "Prediction", "Achievements"])
+    pages = ["Dashboard", "Add Record", "Import", "Goals", "Recurring", "Prediction", "Achievements"]
+    if username in ADMINS:
+        pages.append("Profiling")
+    return st.sidebar.radio("📂 Navigation", pages)
+
+# -------------- Profiling (admins only) --------------
+def profiling_section(username):
+    st.subheader("⏱️ Profiling")
+    if username not in ADMINS:
+        st.error("Admins only.")
+        return
+
+    enabled = st.toggle("Record profiling runs", value=profiler.enabled,
+                        help="Same as EXPENSE_TRACKER_PROFILE=1; applies to every session of this server")
+    if enabled != profiler.enabled:
+        profiler.configure(enabled=enabled)
+        st.rerun()
+
+    runs = profiling.load_runs()
+    if not runs:
+        st.info(f"No runs recorded yet in `{profiler.log_path}`.")
+        return
+    st.caption(f"Last {len(runs)} runs from `{profiler.log_path}`")
+
+    st.markdown("**Slowest functions**")
+    functions = profiling.summarise_functions(runs)
+    st.dataframe(functions.head(25), use_container_width=True)
+
+    st.markdown("**Per-page queries**")
+    st.dataframe(profiling.summarise_pages(runs), use_container_width=True)
+
+    st.markdown("**Call time distribution**")
+    function = st.selectbox("Function", list(functions.index), key="profile_function")
+    samples = profiling.call_samples(runs, function)
+    if samples.size:
+        cols = st.columns(4)
+        for col, q in zip(cols, (50, 90, 95, 99)):
+            col.metric(f"p{q}", f"{np.percentile(samples, q):.2f} ms")
+        counts, edges = np.histogram(samples, bins=min(30, max(samples.size // 5, 5)))
+        st.bar_chart(pd.DataFrame({"calls": counts}, index=[f"{e:.2f}" for e in edges[:-1]]))
+
+    st.markdown("**Slowest statements (recent runs)**")
+    statements = pd.DataFrame([
+        {"page": run.get("page"), "ts": run["ts"], **stmt} for run in runs[-200:] for stmt in run["slow_statements"]
+    ], columns=["page", "ts", "ms", "sql"])
+    st.dataframe(statements.sort_values("ms", ascending=False).head(20), use_container_width=True)
 
 # -------------- Profile Summary --------------
 def profile_section(username):
     st.subheader("👤 Profile")
 
-    income = get_total_income(username)
-    expenses = get_total_expenses(username)
-    savings = income - expenses
-    base = get_base_currency(username)
+    snap = loader.profile(username)
 
-    st.write(f"**Username:** `{username}`")
-    st.write(f"**Base Currency:** {base}")
-    st.write(f"**Total Income:** {base} {income}")
-    st.write(f"**Total Expenses:** {base} {expenses}")
-    st.write(f"**Total Savings:** {base} {savings}")
+    st.write(f"**Username:** `{snap.username}`")
+    st.write(f"**Base Currency:** {snap.base}")
+    st.write(f"**Total Income:** {snap.base} {snap.income}")
+    st.write(f"**Total Expenses:** {snap.base} {snap.expenses}")
+    st.write(f"**Total Savings:** {snap.base} {snap.savings}")
+    if snap.unconverted:
+        st.warning(f"Records in {', '.join(snap.unconverted)} are left out: no exchange rate is loaded for them.")
 
 # -------------- Main --------------
 def main():
     st.set_page_config(page_title="Expense Tracker", layout="wide")
+    scheduler.start_background()
 
     if "username" not in st.session_state:
         login_section()
@@ -183,20 +430,28 @@ def main():
             if st.button("🔓", help="Logout"):
                 logout()
 
-        page = sidebar(username)
-
-        if page == "Dashboard":
-            dashboard(username)
-        elif page == "Add Record":
-            record_section(username)
-        elif page == "Goals":
-            goal_section(username)
-        elif page == "Recurring":
-            recurring_section(username)
-        elif page == "Prediction":
-            budget_prediction(username)
-        elif page == "Achievements":
-            achievements_section(username)
+        # One profiling run per script run; a no-op unless profiling is enabled
+        with profiler.run(user=username) as run:
+            page = sidebar(username)
+            if run is not None:
+                run["page"] = page
+
+            if page == "Dashboard":
+                dashboard(username)
+            elif page == "Add Record":
+                record_section(username)
+            elif page == "Import":
+                import_section(username)
+            elif page == "Goals":
+                goal_section(username)
+            elif page == "Recurring":
+                recurring_section(username)
+            elif page == "Prediction":
+                budget_prediction(username)
+            elif page == "Achievements":
+                achievements_section(username)
+            elif page == "Profiling":
+                profiling_section(username)
 
 # -------------- Run --------------
 if __name__ == "__main__":
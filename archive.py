@@ -0,0 +1,215 @@
+import os
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+
+import db
+
+# -------------- Cold Record Archive --------------
+# Closed months of records can be moved out of SQLite into one Arrow IPC file
+# per month under data/<user>/archive/. Files are written uncompressed so
+# reads memory-map them and only touch the columns asked for.
+#
+# The archived_months table in the user's database is the source of truth: a
+# file only counts once the transaction that deletes its rows from records
+# and registers it has committed. Each write goes to a new file name, so a
+# crash part way leaves either the old file or the new one registered, never
+# a half-written one. The aggregates are left as they are (they already
+# include the archived rows), and archive_agg keeps what the rows contributed
+# so rebuild_aggregates/verify_aggregates still see them.
+
+COLUMNS = ["id", "date", "category", "amount", "type", "description", "currency", "import_hash"]
+SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("date", pa.string()),
+    ("category", pa.dictionary(pa.int32(), pa.string())),
+    ("amount", pa.float64()),
+    ("type", pa.dictionary(pa.int32(), pa.string())),
+    ("description", pa.string()),
+    ("currency", pa.dictionary(pa.int32(), pa.string())),
+    ("import_hash", pa.string()),
+])
+KEEP_MONTHS = 12
+
+def archive_dir(username):
+    return os.path.join("data", username, "archive")
+
+def _month_file(username, month):
+    # A fresh name per write; the previous file is removed after commit
+    return os.path.join(archive_dir(username), f"{month}.{time.time_ns()}.arrow")
+
+# -------------- Reading --------------
+def _read(path, columns=None):
+    with pa.memory_map(path) as source:
+        table = ipc.open_file(source).read_all()
+    return table.select(columns) if columns else table
+
+def _filter(table, start_date=None, end_date=None, category=None, record_type=None, currency=None, cursor=None):
+    conditions = []
+    if start_date:
+        conditions.append(pc.greater_equal(table["date"], str(start_date)))
+    if end_date:
+        conditions.append(pc.less_equal(table["date"], str(end_date)))
+    for column, value in (("category", category), ("type", record_type), ("currency", currency)):
+        if value:
+            conditions.append(pc.equal(table[column].cast(pa.string()), value))
+    if cursor is not None:
+        day, id_ = str(cursor[0]), int(cursor[1])
+        conditions.append(pc.or_(
+            pc.less(table["date"], day),
+            pc.and_(pc.equal(table["date"], day), pc.less(table["id"], id_)),
+        ))
+    if not conditions:
+        return table
+    mask = conditions[0]
+    for condition in conditions[1:]:
+        mask = pc.and_(mask, condition)
+    return table.filter(mask)
+
+def _to_frame(table):
+    # Same dtypes as db.get_records gives the hot rows: dictionary columns come
+    # out as categoricals, dates are parsed to datetime64
+    df = table.to_pandas()
+    if "date" in df:
+        df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d")
+    return df
+
+FILTER_COLUMNS = {"category": "category", "record_type": "type", "currency": "currency"}
+
+def _needed(columns, filters):
+    wanted = set(columns) | {"id", "date"} | {FILTER_COLUMNS[k] for k, v in filters.items() if k in FILTER_COLUMNS and v}
+    return [column for column in COLUMNS if column in wanted]
+
+def read_records(files, limit=None, columns=None, **filters):
+    # files: archive files newest month first (see db._archived_files). Stops
+    # once `limit` matching rows are in hand: older months cannot rank higher.
+    columns = columns or COLUMNS[:-1]
+    frames, found = [], 0
+    for path in files:
+        table = _filter(_read(path, _needed(columns, filters)), **filters)
+        if table.num_rows:
+            frames.append(table.select(columns))
+            found += table.num_rows
+        if limit and found >= limit:
+            break
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return _to_frame(pa.concat_tables(frames))
+
+def iter_rows(files, columns):
+    # Plain Python tuples, file by file, for callers that write rows back out
+    for path in files:
+        table = _read(path, columns)
+        yield from zip(*(table.column(column).to_pylist() for column in columns))
+
+def count_records(files, **filters):
+    return sum(_filter(_read(path, _needed([], filters)), **filters).num_rows for path in files)
+
+# -------------- Archive / Unarchive --------------
+def _default_before(keep_months):
+    return db._month_window(keep_months)[0]
+
+def archive_user(username, before=None, keep_months=KEEP_MONTHS):
+    # Moves every month earlier than `before` ("YYYY-MM"; default keeps the last
+    # keep_months months hot) out of records. Returns {month: rows archived}.
+    # The current month is still open, whatever `before` says
+    before = min(before or _default_before(keep_months), db._month_window(1)[0])
+    os.makedirs(archive_dir(username), exist_ok=True)
+    conn = db.get_connection(username)
+    c = conn.cursor()
+    months = [r[0] for r in c.execute("""
+        SELECT DISTINCT substr(date, 1, 7) FROM records WHERE user_id = ? AND date < ?
+    """, (username, f"{before}-01"))]
+    moved, stale = {}, []
+    try:
+        for month in sorted(months):
+            c.execute("BEGIN IMMEDIATE")
+            rows = pd.read_sql("""
+                SELECT id, date, category, amount, type, description, currency, import_hash
+                FROM records_named
+                WHERE user_id = ? AND date >= ? AND date < ?
+                ORDER BY date, id
+            """, conn, params=(username, f"{month}-01", f"{month}-32"))
+            if rows.empty:
+                conn.rollback()
+                continue
+            c.execute("SELECT file FROM archived_months WHERE user_id = ? AND month = ?", (username, month))
+            existing = c.fetchone()
+            table = pa.Table.from_pandas(rows, schema=SCHEMA, preserve_index=False)
+            if existing:
+                # Late rows for a month archived before: rewrite it as one file
+                table = pa.concat_tables([_read(existing[0]).cast(SCHEMA), table])
+                table = table.sort_by([("date", "ascending"), ("id", "ascending")])
+            path = _month_file(username, month)
+            with pa.OSFile(path, "wb") as sink, ipc.new_file(sink, SCHEMA) as writer:
+                writer.write_table(table.combine_chunks())
+
+            ids = [(int(i),) for i in rows["id"]]
+            c.execute("""
+                INSERT INTO archive_agg (user_id, type, category, currency, day, amount, count)
+                SELECT user_id, type, category, currency, date, SUM(amount), COUNT(*)
+                FROM records_named
+                WHERE user_id = ? AND date >= ? AND date < ?
+                GROUP BY type, category, currency, date
+                ON CONFLICT(user_id, type, category, currency, day) DO UPDATE
+                SET amount = amount + excluded.amount, count = count + excluded.count
+            """, (username, f"{month}-01", f"{month}-32"))
+            c.execute("""
+                INSERT OR IGNORE INTO archive_hashes (user_id, import_hash)
+                SELECT user_id, import_hash FROM records
+                WHERE user_id = ? AND date >= ? AND date < ? AND import_hash IS NOT NULL
+            """, (username, f"{month}-01", f"{month}-32"))
+            c.executemany("DELETE FROM records WHERE id = ?", ids)
+            c.execute("""
+                INSERT INTO archived_months (user_id, month, file, rows) VALUES (?, ?, ?, ?)
+                ON CONFLICT(user_id, month) DO UPDATE SET file = excluded.file, rows = excluded.rows
+            """, (username, month, path, table.num_rows))
+            conn.commit()
+            if existing:
+                stale.append(existing[0])
+            moved[month] = len(ids)
+    finally:
+        conn.close()
+        db._bump_version(username)
+    for path in stale:
+        os.remove(path)
+    return moved
+
+def unarchive_user(username, months=None):
+    # Moves archived months (all by default) back into records. Returns {month: rows restored}.
+    conn = db.get_connection(username)
+    c = conn.cursor()
+    c.execute("SELECT month, file FROM archived_months WHERE user_id = ? ORDER BY month", (username,))
+    archived = [(m, f) for m, f in c.fetchall() if months is None or m in months]
+    restored, removed = {}, []
+    try:
+        for month, path in archived:
+            rows = list(iter_rows([path], COLUMNS[1:]))
+            c.execute("BEGIN IMMEDIATE")
+            # The hashes go first: db._insert_records skips rows whose hash is archived
+            c.executemany("DELETE FROM archive_hashes WHERE user_id = ? AND import_hash = ?",
+                          ((username, row[-1]) for row in rows if row[-1] is not None))
+            # Ids are reassigned (they may be taken in the shared store); order is kept
+            db._insert_records(c, username, rows)
+            c.execute("DELETE FROM archive_agg WHERE user_id = ? AND day >= ? AND day < ?",
+                      (username, f"{month}-01", f"{month}-32"))
+            c.execute("DELETE FROM archived_months WHERE user_id = ? AND month = ?", (username, month))
+            conn.commit()
+            removed.append(path)
+            restored[month] = len(rows)
+    finally:
+        conn.close()
+        db._bump_version(username)
+    for path in removed:
+        os.remove(path)
+    return restored
+
+def archived_months(username):
+    conn = db.get_connection(username)
+    df = pd.read_sql("SELECT month, rows, file FROM archived_months WHERE user_id = ? ORDER BY month",
+                     conn, params=(username,))
+    conn.close()
+    return df
@@ -0,0 +1,3 @@
+# Benchmarks. The standalone bench_*.py scripts each measure one change;
+# the suite (python -m benchmarks.suite) times every db.py entry point on
+# generated data and compares the results with a saved baseline.
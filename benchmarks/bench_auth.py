@@ -0,0 +1,64 @@
+# Logins/sec for each password-hash cost setting.
+# Registers a few users per setting, then fires --logins logins from --threads
+# concurrent "sessions" at Auth.verify_user and reports throughput and the
+# per-login latency (queueing on the hash workers included).
+#   python benchmarks/bench_auth.py --logins 64 --threads 16 --workers 4
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import Auth
+
+SETTINGS = [
+    ("scrypt", {"n": 2 ** 14, "r": 8, "p": 1}),
+    ("scrypt", {"n": 2 ** 15, "r": 8, "p": 1}),
+    ("scrypt", {"n": 2 ** 16, "r": 8, "p": 1}),
+    ("pbkdf2_sha256", {"iterations": 200_000}),
+    ("pbkdf2_sha256", {"iterations": 600_000}),
+]
+PASSWORD = "bench-password"
+
+def run_setting(algorithm, params, logins, threads, users):
+    Auth.configure_hashing(algorithm, params)
+    names = [f"{algorithm}-{'-'.join(map(str, params.values()))}-{i}" for i in range(users)]
+    for name in names:
+        Auth.add_user(name, PASSWORD)
+
+    def login(i):
+        t0 = time.perf_counter()
+        assert Auth.verify_user(names[i % users], PASSWORD)
+        return time.perf_counter() - t0
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as sessions:
+        latencies = np.array(list(sessions.map(login, range(logins)))) * 1000
+    elapsed = time.perf_counter() - started
+    return logins / elapsed, np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=16, help="concurrent sessions logging in")
+    parser.add_argument("--workers", type=int, default=Auth.HASH_WORKERS, help="hash worker threads")
+    parser.add_argument("--users", type=int, default=4)
+    args = parser.parse_args()
+
+    Auth.configure_hashing(workers=args.workers)
+    print(f"{args.logins} logins from {args.threads} sessions on {args.workers} hash worker(s)")
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        for algorithm, params in SETTINGS:
+            rate, p50, p95 = run_setting(algorithm, params, args.logins, args.threads, args.users)
+            label = f"{algorithm} {', '.join(f'{k}={v}' for k, v in params.items())}"
+            print(f"  {label:34s} {rate:8.1f} logins/s   p50 {p50:8.1f} ms   p95 {p95:8.1f} ms")
+        Auth.close()
+
+if __name__ == "__main__":
+    main()
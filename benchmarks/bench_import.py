@@ -0,0 +1,53 @@
+# Stream a synthetic bank CSV through importer.import_records and report
+# throughput and peak RSS.  python benchmarks/bench_import.py --rows 1000000
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import importer
+
+def write_statement(path, rows):
+    rng = random.Random(7)
+    day = date(2015, 1, 1)
+    with open(path, "w") as f:
+        f.write("Date,Amount,Narration,Currency\n")
+        for i in range(rows):
+            if i % 40 == 0:
+                day += timedelta(days=1)
+            amount = round(rng.uniform(-500, 500), 2)
+            f.write(f"{day.isoformat()},{amount},txn {rng.randrange(10_000)},{rng.choice(['INR', 'USD'])}\n")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=importer.CHUNK_SIZE)
+    args = parser.parse_args()
+
+    mapping = {"date": "Date", "amount": "Amount", "description": "Narration", "currency": "Currency"}
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        write_statement("statement.csv", args.rows)
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        with open("statement.csv", "rb") as f:
+            stats = importer.import_records("bench", f, mapping=mapping, date_format="%Y-%m-%d",
+                                            chunk_size=args.chunk_size)
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        with open("statement.csv", "rb") as f:
+            again = importer.import_records("bench", f, mapping=mapping, date_format="%Y-%m-%d",
+                                            chunk_size=args.chunk_size)
+
+    print(f"rows:          {stats['rows']:,}")
+    print(f"inserted:      {stats['inserted']:,}")
+    print(f"time:          {stats['seconds']:.1f} s")
+    print(f"throughput:    {stats['rows_per_sec']:,.0f} rows/sec")
+    print(f"peak RSS:      {rss_after / 1024:.0f} MB (+{(rss_after - rss_before) / 1024:.0f} MB during import)")
+    print(f"re-import:     {again['duplicates']:,} duplicates skipped, {again['inserted']} inserted")
+
+if __name__ == "__main__":
+    main()
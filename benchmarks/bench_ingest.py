@@ -0,0 +1,80 @@
+# Record ingestion throughput: one add_record (and commit) per row vs the
+# group-commit queue in ingest.py.
+# --producers threads push --rows records between them, spread over --users
+# users. The queued run is timed until every Future has resolved (so every
+# row is committed); ack latency is enqueue -> commit for each row.
+#   python benchmarks/bench_ingest.py --rows 20000 --producers 8 --users 4
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import db
+import ingest
+
+def produce(rows, producers, users, push):
+    # Runs push(username, i) for every row from `producers` threads; -> seconds
+    def work(p):
+        for i in range(p, rows, producers):
+            push(users[i % len(users)], i)
+
+    threads = [threading.Thread(target=work, args=(p,)) for p in range(producers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - started
+
+def per_row(rows, producers, users):
+    return produce(rows, producers, users,
+                   lambda u, i: db.add_record(u, "Food", 12.5, "Expense", f"card {i}", "INR")), None
+
+def queued(rows, producers, users):
+    latencies = np.zeros(rows)
+
+    def push(u, i):
+        t0 = time.perf_counter()
+        future = ingest.enqueue_record(u, "Food", 12.5, "Expense", f"card {i}", "INR")
+        future.add_done_callback(lambda _: latencies.__setitem__(i, time.perf_counter() - t0))
+
+    started = time.perf_counter()
+    produce(rows, producers, users, push)
+    ingest.flush()
+    return time.perf_counter() - started, latencies * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--producers", type=int, default=8)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--linger", type=float, default=ingest.LINGER * 1000, help="writer linger (ms)")
+    parser.add_argument("--batch-rows", type=int, default=ingest.BATCH_ROWS)
+    args = parser.parse_args()
+
+    ingest.configure(linger=args.linger / 1000, batch_rows=args.batch_rows)
+    print(f"{args.rows:,} records from {args.producers} producers over {args.users} users ({db.STORAGE})")
+    for name, run in (("per-row add_record", per_row), ("group-commit queue", queued)):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            users = [f"ingest{i}" for i in range(args.users)]
+            for u in users:
+                db.create_user_db(u)
+            elapsed, latencies = run(args.rows, args.producers, users)
+            stored = sum(db.count_records(u) for u in users)
+            assert stored == args.rows, (stored, args.rows)
+            note = ""
+            if latencies is not None:
+                note = f"   ack p50 {np.percentile(latencies, 50):6.1f} ms   p95 {np.percentile(latencies, 95):6.1f} ms"
+            print(f"  {name:20s} {args.rows / elapsed:10,.0f} rows/s   {elapsed:6.2f} s{note}")
+            ingest.close()
+            db.close_connections()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# Memory and disk footprint of records: text columns (the old layout) vs
+# lookup codes + pandas categoricals (the current one).
+# Reads the same generated rows both ways and compares the DataFrames' deep
+# memory use and load time, then the on-disk size of the records table and its
+# indexes (via dbstat) against a copy laid out the old way.
+#   python benchmarks/bench_memory.py --records 200000
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import db
+from benchmarks import datagen
+
+LEGACY_SQL = """
+    SELECT id, date, category, amount, type, description, currency
+    FROM records_named WHERE user_id = ? ORDER BY date DESC, id DESC
+"""
+
+def legacy_frame(username):
+    # What get_records returned before: every text column as Python strings
+    conn = db.get_connection(username)
+    df = pd.read_sql(LEGACY_SQL, conn, params=(username,))
+    conn.close()
+    return df.astype({c: object for c in ("date", "category", "type", "description", "currency")})
+
+def timed(fn, repeat):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+def table_bytes(conn, schema, table):
+    # Pages used by the table and every index on it
+    names = [table] + [r[0] for r in conn.execute(
+        f"SELECT name FROM {schema}.sqlite_master WHERE type = 'index' AND tbl_name = ?", (table,))]
+    marks = ",".join("?" * len(names))
+    return conn.execute(f"SELECT SUM(pgsize) FROM dbstat(?) WHERE name IN ({marks})", [schema] + names).fetchone()[0]
+
+def disk_footprint(username, legacy_path):
+    conn = sqlite3.connect(db.user_db_path(username))
+    conn.execute("ATTACH DATABASE ? AS legacy", (legacy_path,))
+    conn.execute("""
+        CREATE TABLE legacy.records AS
+        SELECT id, user_id, date, category, amount, type, description, currency, import_hash FROM records_named
+    """)
+    conn.execute("CREATE INDEX legacy.idx_records_user_date ON records(user_id, date)")
+    conn.execute("CREATE INDEX legacy.idx_records_user_type_currency ON records(user_id, type, currency)")
+    conn.execute("CREATE UNIQUE INDEX legacy.idx_records_user_import_hash ON records(user_id, import_hash)")
+    conn.commit()
+    sizes = table_bytes(conn, "legacy", "records"), table_bytes(conn, "main", "records")
+    conn.close()
+    return sizes
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # Measure the reads themselves, not the read cache
+    db.configure_cache(enabled=False)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        username = datagen.generate(users=1, records=args.records, seed=7)[0]
+
+        old_time, old = timed(lambda: legacy_frame(username), args.repeat)
+        new_time, new = timed(lambda: db.get_records(username), args.repeat)
+        old_bytes = old.memory_usage(deep=True)
+        new_bytes = new.memory_usage(deep=True)
+        db.close_connections()
+        old_disk, new_disk = disk_footprint(username, os.path.join(tmp, "legacy.db"))
+
+        print(f"records:      {len(new):,}")
+        print(f"{'column':12s} {'text (MB)':>10s} {'coded (MB)':>11s}  dtype now")
+        for column in new.columns:
+            print(f"{column:12s} {old_bytes[column] / 1e6:10.2f} {new_bytes[column] / 1e6:11.2f}  {new[column].dtype}")
+        print(f"{'total':12s} {old_bytes.sum() / 1e6:10.2f} {new_bytes.sum() / 1e6:11.2f}  "
+              f"({old_bytes.sum() / new_bytes.sum():.1f}x smaller)")
+        print(f"load:         {old_time * 1000:10.1f} ms {new_time * 1000:8.1f} ms")
+        print(f"on disk:      {old_disk / 1e6:10.2f} MB {new_disk / 1e6:8.2f} MB  (records + indexes)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# Page data loading: each page's reads called one after another (each with
+# its own connection checkout) versus loader.py. Uncached, large history.
+#   python benchmarks/bench_pages.py --records 200000
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import db
+import loader
+from benchmarks import datagen
+
+def sequential_goals(u):
+    return (db.get_goal(u), db.get_goal_series(u), db.get_streak(u), db.get_best_streak(u),
+            db.get_streak_series(u))
+
+def sequential_prediction(u):
+    return db.get_monthly_spending_by_category(u, months=12), db.get_base_currency(u), db.get_goal(u)
+
+def sequential_achievements(u):
+    return db.get_achievements(u)
+
+PAGES = [
+    ("Dashboard", db.get_totals, loader.dashboard),
+    ("Goals", sequential_goals, loader.goals),
+    ("Prediction", sequential_prediction, loader.prediction),
+    ("Achievements", sequential_achievements, loader.achievements),
+]
+
+def timings(fn, username, repeat):
+    values = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(username)
+        values.append((time.perf_counter() - t0) * 1000)
+    return np.percentile(values, 50), np.percentile(values, 95)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--cache", action="store_true")
+    args = parser.parse_args()
+
+    db.configure_cache(enabled=args.cache)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        username = datagen.generate(1, args.records)[0]
+        print(f"{args.records:,} records, cache {'on' if args.cache else 'off'}")
+        for page, sequential, loaded in PAGES:
+            s50, s95 = timings(sequential, username, args.repeat)
+            l50, l95 = timings(loaded, username, args.repeat)
+            print(f"  {page:12s} sequential p50 {s50:7.2f} p95 {s95:7.2f} ms | loader p50 {l50:7.2f} p95 {l95:7.2f} ms")
+        db.close_connections()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Goal and streak chart payloads: full history vs the downsampled series.
+# Writes --years of daily goal updates for one user, then compares row count,
+# JSON payload size and read time of get_goal_history / get_streak_growth
+# against get_goal_series / get_streak_series at --points.
+#   python benchmarks/bench_series.py --years 10 --points 500
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import db
+
+def seed(username, days, rng):
+    # One goal row and one streak row per day, streaks reset ~every 30 days
+    start = date.today() - timedelta(days=days - 1)
+    dates = [(start + timedelta(days=i)).isoformat() for i in range(days)]
+    goals = 20_000 + rng.normal(0, 500, days).cumsum()
+    resets = rng.random(days) < 1 / 30
+    streak = np.arange(days) - np.maximum.accumulate(np.where(resets, np.arange(days), 0))
+    conn = db.get_connection(username)
+    conn.executemany("INSERT INTO goals (user_id, date, goal) VALUES (?, ?, ?)",
+                     [(username, d, float(g)) for d, g in zip(dates, goals)])
+    conn.executemany("INSERT INTO streaks (user_id, date, streak) VALUES (?, ?, ?)",
+                     [(username, d, int(s) + 1) for d, s in zip(dates, streak)])
+    conn.commit()
+    conn.close()
+
+def measure(fn, repeat):
+    best, df = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        df = fn()
+        best = min(best, time.perf_counter() - t0)
+    return len(df), len(df.to_json(date_format="iso")), best * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--points", type=int, default=db.SERIES_POINTS)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    db.configure_cache(enabled=False)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        username = "series"
+        db.create_user_db(username)
+        seed(username, args.years * 365, np.random.default_rng(7))
+        cases = [
+            ("goal history", lambda: db.get_goal_history(username),
+             lambda: db.get_goal_series(username, args.points)),
+            ("streak growth", lambda: db.get_streak_growth(username),
+             lambda: db.get_streak_series(username, args.points)),
+        ]
+        print(f"{args.years} years of daily updates, {args.points} points")
+        for name, full, series in cases:
+            rows, size, ms = measure(full, args.repeat)
+            rows2, size2, ms2 = measure(series, args.repeat)
+            print(f"  {name:14s} full {rows:6,d} rows {size / 1e3:8.1f} KB {ms:7.1f} ms   "
+                  f"series {rows2:5,d} rows {size2 / 1e3:7.1f} KB {ms2:7.1f} ms   ({size / size2:.1f}x smaller)")
+        db.close_connections()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# Compare the per-user-file layout with the consolidated shared store.
+# Builds N per-user files, folds them into the shared store with
+# consolidate.py, then times the same page reads/writes against both.
+#   python benchmarks/bench_storage.py --users 10000 --records 50
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import consolidate
+import db
+
+CURRENCIES = ["INR", "USD", "EUR", "GBP"]
+CATEGORIES = ["Food", "Travel", "Shopping", "Bills", "Other"]
+
+def build_per_user(users, records):
+    rng = random.Random(1)
+    start = date(2023, 1, 1)
+    for i, username in enumerate(users):
+        rows = [
+            ((start + timedelta(days=rng.randrange(700))).isoformat(), rng.choice(CATEGORIES),
+             round(rng.uniform(1, 500), 2), rng.choice(["Income", "Expense"]), "bench",
+             rng.choice(CURRENCIES), None)
+            for _ in range(records)
+        ]
+        db.add_records(username, rows)
+        if i % 1000 == 999:
+            # Keep the pool from holding thousands of descriptors while building
+            db.close_connections()
+
+def disk_usage(paths):
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+def time_ops(users, ops, rng):
+    timings = {"get_totals": [], "get_records page": [], "add_record": []}
+    for _ in range(ops):
+        username = rng.choice(users)
+        t0 = time.perf_counter()
+        db.get_totals(username)
+        t1 = time.perf_counter()
+        db.get_records(username, page_size=50)
+        t2 = time.perf_counter()
+        db.add_record(username, "Food", 1.0, "Expense", "bench", "INR")
+        t3 = time.perf_counter()
+        timings["get_totals"].append(t1 - t0)
+        timings["get_records page"].append(t2 - t1)
+        timings["add_record"].append(t3 - t2)
+    return timings
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--records", type=int, default=50)
+    parser.add_argument("--ops", type=int, default=2_000)
+    args = parser.parse_args()
+
+    db.configure_cache(enabled=False)
+    users = [f"user{i:05d}" for i in range(args.users)]
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        db.configure_storage("per_user")
+        t0 = time.perf_counter()
+        build_per_user(users, args.records)
+        print(f"built {args.users:,} per-user files in {time.perf_counter() - t0:.1f}s")
+        db.close_connections()
+
+        stats = consolidate.consolidate(users)
+        print(f"consolidated {stats['users']:,} users / {stats['records']:,} records in {stats['seconds']:.1f}s")
+
+        per_user_files = [db.user_db_path(u) for u in users]
+        sizes = {
+            "per_user": disk_usage(per_user_files),
+            "shared": disk_usage([db.SHARED_DB, db.SHARED_DB + "-wal"]),
+        }
+        files = {"per_user": len(per_user_files), "shared": 1}
+
+        for mode in ("per_user", "shared"):
+            db.configure_storage(mode)
+            before = db.pool_stats()
+            timings = time_ops(users, args.ops, random.Random(2))
+            after = db.pool_stats()
+            print(f"\n== {mode}: {files[mode]:,} file(s), {sizes[mode] / 1e6:.1f} MB, "
+                  f"pool opens={after['opens'] - before['opens']} "
+                  f"evictions={after['evictions'] - before['evictions']}")
+            for name, values in timings.items():
+                print(f"  {name:18s} p50 {pct(values, 0.5):7.2f} ms   p95 {pct(values, 0.95):7.2f} ms")
+        db.close_connections()
+
+if __name__ == "__main__":
+    main()
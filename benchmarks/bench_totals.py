@@ -0,0 +1,82 @@
+# Compare get_totals against the old per-row iterrows totals.
+# Run from the repo root:  python benchmarks/bench_totals.py --records 100000
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import db
+
+CURRENCIES = ["INR", "USD", "EUR", "GBP"]
+CATEGORIES = ["Food", "Travel", "Shopping", "Bills", "Other"]
+
+def seed(username, n):
+    db.create_user_db(username)
+    rng = random.Random(42)
+    start = date(2020, 1, 1)
+    rows = [
+        (
+            (start + timedelta(days=rng.randrange(2000))).isoformat(),
+            rng.choice(CATEGORIES),
+            round(rng.uniform(1, 5000), 2),
+            rng.choice(["Income", "Expense"]),
+            "bench",
+            rng.choice(CURRENCIES),
+            None,
+        )
+        for _ in range(n)
+    ]
+    db.add_records(username, rows)
+
+# Previous implementation, kept here only as the benchmark reference
+def legacy_convert(amount, from_currency, to_currency):
+    rates = {"INR": 1, "USD": 83, "EUR": 90, "GBP": 100}
+    if from_currency == to_currency:
+        return amount
+    return amount * rates[from_currency] / rates[to_currency]
+
+def legacy_total(username, rtype):
+    conn = db.get_connection(username)
+    df = pd.read_sql("SELECT amount, currency FROM records_named WHERE type=?", conn, params=(rtype,))
+    conn.close()
+    base = db.get_base_currency(username)
+    return round(sum(legacy_convert(r["amount"], r["currency"], base) for _, r in df.iterrows()), 2)
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # Measure the query itself, not the read cache
+    db.configure_cache(enabled=False)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        username = "bench"
+        seed(username, args.records)
+
+        legacy_time, legacy = timed(
+            lambda: (legacy_total(username, "Income"), legacy_total(username, "Expense")), args.repeat)
+        new_time, totals = timed(lambda: db.get_totals(username), args.repeat)
+
+        print(f"records:            {args.records}")
+        print(f"legacy (2x iterrows): {legacy_time * 1000:9.1f} ms  income={legacy[0]} expenses={legacy[1]}")
+        print(f"get_totals:           {new_time * 1000:9.1f} ms  income={totals['income']} expenses={totals['expenses']}")
+        print(f"speedup:              {legacy_time / new_time:9.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import random
+from datetime import date, timedelta
+
+import db
+
+# -------------- Synthetic Data --------------
+# Deterministic for a given seed: the same users get the same records, goals,
+# recurring rules and achievements on every run. Dates are laid out backwards
+# from `end` (today by default) so the month windows the app reads always
+# fall inside the generated history.
+
+CURRENCIES = ["INR", "USD", "EUR", "GBP"]
+CATEGORIES = ["Food", "Travel", "Shopping", "Bills", "Health", "Salary", "Other"]
+FREQUENCIES = ["daily", "weekly", "monthly"]
+ACHIEVEMENTS = ["First Record", "Saver", "Goal Setter", "7 Day Streak", "30 Day Streak"]
+
+def usernames(users):
+    return [f"bench{i:04d}" for i in range(users)]
+
+def generate_user(username, records, seed=0, end=None, days=730, goal_days=120, recurring=6):
+    rng = random.Random(f"{seed}:{username}")
+    end = end or date.today()
+    start = end - timedelta(days=days - 1)
+    db.create_user_db(username)
+
+    rows = [
+        (
+            (start + timedelta(days=rng.randrange(days))).isoformat(),
+            rng.choice(CATEGORIES),
+            round(rng.uniform(1, 5000), 2),
+            "Income" if rng.random() < 0.25 else "Expense",
+            f"txn {i}",
+            rng.choice(CURRENCIES),
+            None,
+        )
+        for i in range(records)
+    ]
+    for offset in range(0, len(rows), 50_000):
+        db.add_records(username, rows[offset:offset + 50_000])
+
+    # Goal history with gaps, so streaks have several runs to track
+    goal_dates = sorted({end - timedelta(days=rng.randrange(goal_days)) for _ in range(goal_days)})
+    db.set_goal(username, round(rng.uniform(1_000, 50_000), 2))
+    conn = db.get_connection(username)
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    c.executemany("INSERT INTO goals (user_id, date, goal) VALUES (?, ?, ?)",
+                  ((username, d.isoformat(), round(rng.uniform(1_000, 50_000), 2)) for d in goal_dates))
+    db._rebuild_streaks(c, username)
+    conn.commit()
+    conn.close()
+
+    for _ in range(recurring):
+        db.add_recurring_transaction(
+            username, rng.choice(CATEGORIES), round(rng.uniform(10, 2000), 2),
+            rng.choice(["Income", "Expense"]), "bench rule", rng.choice(FREQUENCIES),
+            (end - timedelta(days=rng.randrange(1, 90))).isoformat(), rng.choice(CURRENCIES),
+        )
+    db.process_due_recurring_transactions(username, today=end)
+
+    for name in rng.sample(ACHIEVEMENTS, rng.randrange(1, len(ACHIEVEMENTS) + 1)):
+        db.unlock_achievement(username, name)
+    db.set_base_currency(username, rng.choice(CURRENCIES))
+    # Goals and streaks were written directly, so their rules have not run yet
+    db.backfill_achievements(username)
+
+def generate(users, records, seed=0, end=None, password="bench-password"):
+    # N users with M records each, also registered with Auth. Returns the usernames.
+    import Auth
+    names = usernames(users)
+    for username in names:
+        generate_user(username, records, seed=seed, end=end)
+    Auth.initialize_auth_db()
+    for username in names:
+        Auth.add_user(username, password)
+    return names
@@ -0,0 +1,200 @@
+# Time every public db.py function (and Auth.verify_user) on generated data
+# at several sizes; report p50/p95 latency and peak traced memory.
+#   python -m benchmarks.suite --sizes 1000,10000,100000 --output results.json
+#   python -m benchmarks.suite --baseline results.json --tolerance 0.25
+# With --baseline the run fails (exit 1) when a p50 or p95 is slower than the
+# baseline by more than the tolerance.
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import Auth
+import db
+import rates
+from benchmarks import datagen
+
+PASSWORD = "bench-password"
+MIN_SLACK_MS = 0.05  # below this, differences are timer noise
+
+# -------------- Cases --------------
+# (name, fn(username), setup(username) or None). setup runs untimed before
+# each call. Reads come first; writes that change what later cases see
+# (set_goal clears the goal history) go last.
+
+def _reset_recurring(username):
+    # Rewind every rule a month so each call has a catch-up to generate
+    conn = db.get_connection(username)
+    conn.execute("UPDATE recurring SET next_due = date(next_due, '-1 month') WHERE user_id = ?", (username,))
+    conn.commit()
+    conn.close()
+
+def _new_rows(n):
+    day = date.today().isoformat()
+    return [(day, "Food", 12.5, "Expense", "bench batch", "INR", None)] * n
+
+def _verify_user(username):
+    return Auth.verify_user(username, PASSWORD)
+
+CASES = [
+    ("get_records", lambda u: db.get_records(u), None),
+    ("get_records[page]", lambda u: db.get_records(u, page_size=50), None),
+    ("get_records[filtered page]", lambda u: db.get_records(u, page_size=50, category="Food", record_type="Expense"), None),
+    ("count_records", lambda u: db.count_records(u), None),
+    ("count_records[filtered]", lambda u: db.count_records(u, category="Food"), None),
+    ("search_records", lambda u: db.search_records(u, "bench"), None),
+    ("search_records[prefix]", lambda u: db.search_records(u, "tx"), None),
+    ("get_totals", db.get_totals, None),
+    ("get_total_income", db.get_total_income, None),
+    ("get_total_expenses", db.get_total_expenses, None),
+    ("get_base_currency", db.get_base_currency, None),
+    ("get_goal", db.get_goal, None),
+    ("get_goal_history", db.get_goal_history, None),
+    ("get_streak", db.get_streak, None),
+    ("get_best_streak", db.get_best_streak, None),
+    ("get_streak_growth", db.get_streak_growth, None),
+    ("get_streak_stats", db.get_streak_stats, None),
+    ("get_goal_series", db.get_goal_series, None),
+    ("get_streak_series", db.get_streak_series, None),
+    ("get_achievements", db.get_achievements, None),
+    ("get_recurring_transactions", db.get_recurring_transactions, None),
+    ("get_monthly_spending_by_category", db.get_monthly_spending_by_category, None),
+    ("get_schema_version", db.get_schema_version, None),
+    ("list_users", lambda u: db.list_users(), None),
+    ("verify_aggregates", db.verify_aggregates, None),
+    ("Auth.verify_user", _verify_user, None),
+    ("add_record", lambda u: db.add_record(u, "Food", 12.5, "Expense", "bench", "USD"), None),
+    ("add_records[100]", lambda u: db.add_records(u, _new_rows(100)), None),
+    ("log_goal_history", lambda u: db.log_goal_history(u, 25_000), None),
+    ("unlock_achievement", lambda u: db.unlock_achievement(u, "Saver"), None),
+    ("add_recurring_transaction", lambda u: db.add_recurring_transaction(
+        u, "Bills", 99.0, "Expense", "bench", "monthly", date.today().isoformat(), "INR"), None),
+    ("process_due_recurring_transactions", db.process_due_recurring_transactions, _reset_recurring),
+    ("set_base_currency", lambda u: db.set_base_currency(u, "INR"), None),
+    ("rebuild_aggregates", db.rebuild_aggregates, None),
+    ("set_goal", lambda u: db.set_goal(u, 30_000), None),
+]
+
+# -------------- Measurement --------------
+def measure(fn, setup, users, repeat):
+    timings = []
+    for i in range(repeat):
+        username = users[i % len(users)]
+        if setup:
+            setup(username)
+        t0 = time.perf_counter()
+        fn(username)
+        timings.append(time.perf_counter() - t0)
+
+    # One more call under tracemalloc; kept apart so tracing does not skew timings
+    username = users[0]
+    if setup:
+        setup(username)
+    tracemalloc.start()
+    fn(username)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = np.array(timings) * 1000
+    return {
+        "n": repeat,
+        "p50_ms": round(float(np.percentile(timings, 50)), 4),
+        "p95_ms": round(float(np.percentile(timings, 95)), 4),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+def run_size(records, users, repeat, seed, cases):
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            t0 = time.perf_counter()
+            names = datagen.generate(users, records, seed=seed, password=PASSWORD)
+            print(f"\n== {users} user(s) x {records:,} records (generated in {time.perf_counter() - t0:.1f}s)")
+            results = {}
+            for name, fn, setup in cases:
+                results[name] = measure(fn, setup, names, repeat)
+                r = results[name]
+                print(f"  {name:38s} p50 {r['p50_ms']:9.3f} ms  p95 {r['p95_ms']:9.3f} ms  peak {r['peak_kb']:9.1f} KB")
+            return results
+        finally:
+            db.close_connections()
+            rates.close()
+            Auth.close()
+            os.chdir(cwd)
+
+# -------------- Baseline Comparison --------------
+def compare(current, baseline, tolerance):
+    # Returns [(size, case, metric, baseline_ms, current_ms)] for every slowdown
+    regressions = []
+    for size, cases in baseline.get("results", {}).items():
+        for case, old in cases.items():
+            new = current.get("results", {}).get(size, {}).get(case)
+            if new is None:
+                continue
+            for metric in ("p50_ms", "p95_ms"):
+                limit = max(old[metric] * (1 + tolerance), old[metric] + MIN_SLACK_MS)
+                if new[metric] > limit:
+                    regressions.append((size, case, metric, old[metric], new[metric]))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Expense Tracker benchmark suite")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="records per user, comma separated")
+    parser.add_argument("--users", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", help="comma separated case names")
+    parser.add_argument("--cache", action="store_true", help="leave the read cache on (default measures uncached reads)")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown as a fraction (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    cases = CASES
+    if args.only:
+        wanted = set(args.only.split(","))
+        cases = [case for case in CASES if case[0] in wanted]
+    output = os.path.abspath(args.output) if args.output else None
+    db.configure_cache(enabled=args.cache)
+
+    current = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "storage": db.STORAGE,
+            "users": args.users,
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "cache": args.cache,
+        },
+        "results": {str(size): run_size(size, args.users, args.repeat, args.seed, cases) for size in sizes},
+    }
+    if output:
+        with open(output, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"\nwrote {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.tolerance)
+        print(f"\n{len(regressions)} regression(s) against {args.baseline} (tolerance {args.tolerance:.0%})")
+        for size, case, metric, old, new in regressions:
+            print(f"  {size:>8s} records  {case:38s} {metric} {old:.3f} -> {new:.3f} ms")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
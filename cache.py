@@ -0,0 +1,90 @@
+import sys
+import threading
+from collections import OrderedDict
+
+from lazy import loaded
+
+# -------------- Versioned Read Cache --------------
+# Entries are keyed by (function, username, args) and stamped with the user's
+# data version at the time they were loaded. A lookup with a newer version is
+# a miss and replaces the entry, so writes never have to find and delete the
+# entries they invalidate. The cache is one LRU across all users, bounded by
+# an approximate byte budget.
+
+def _is_frame(value):
+    # Without pandas imported nothing can be a DataFrame; don't import it to find out
+    if not loaded("pandas"):
+        return False
+    import pandas as pd
+    return isinstance(value, pd.DataFrame)
+
+def sizeof(value):
+    if _is_frame(value):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(v) for v in value.values())
+    return sys.getsizeof(value)
+
+def copy_value(value):
+    # Callers are free to mutate what they get back
+    if _is_frame(value):
+        return value.copy()
+    if isinstance(value, dict):
+        return {k: copy_value(v) for k, v in value.items()}
+    return value
+
+
+class ReadCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self._entries = OrderedDict()  # key -> (version, value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, version, loader):
+        if not self.enabled:
+            return loader()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy_value(entry[1])
+            self.misses += 1
+
+        value = loader()
+        size = sizeof(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            if size <= self.max_bytes:
+                self._entries[key] = (version, value, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    _, (_, _, evicted) = self._entries.popitem(last=False)
+                    self._bytes -= evicted
+                    self.evictions += 1
+        return copy_value(value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,109 @@
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+
+# -------------- Fold Per-User Files into the Shared Store --------------
+# Each per-user file is first brought to the current schema (in parallel, one
+# worker per file), then copied into the shared database with ATTACH +
+# INSERT ... SELECT so rows never pass through Python. SQLite allows a single
+# writer, so the copies run one user at a time on one connection, each in its
+# own transaction. Re-running is safe: a user's rows in the shared store are
+# replaced, not appended.
+
+# table -> columns copied (ids are reassigned by the shared store; rows are
+# copied in id order so relative order survives)
+TABLES = {
+    "records": "user_id, date, category_id, amount, type_id, description, currency_id, import_hash",
+    "recurring": "user_id, category, amount, type, description, frequency, start_date, next_due, currency",
+    "goals": "user_id, date, goal",
+    "streaks": "user_id, date, streak",
+    "achievements": "user_id, name, date",
+    "user_settings": "user_id, key, value",
+    "agg_totals": "user_id, type, currency, day, amount, count",
+    "agg_category": "user_id, type, category, currency, day, amount, count",
+    "agg_month": "user_id, type, category, currency, month, amount, count",
+    "archived_months": "user_id, month, file, rows",
+    "archive_agg": "user_id, type, category, currency, day, amount, count",
+    "archive_hashes": "user_id, import_hash",
+    "tenants": "user_id",
+}
+# Lookup codes are local to each file, so records are matched up by name
+SOURCES = {
+    "records": """
+        SELECT r.user_id, r.date, c.id, r.amount, t.id, r.description, cu.id, r.import_hash
+        FROM src.records_named r
+        LEFT JOIN main.categories c ON c.name = r.category
+        LEFT JOIN main.record_types t ON t.name = r.type
+        LEFT JOIN main.currencies cu ON cu.name = r.currency
+        ORDER BY r.id
+    """,
+}
+
+def _prepare(username):
+    # Migrate the source file and return its row count
+    conn = sqlite3.connect(db.user_db_path(username))
+    try:
+        db._migrate(conn, username)
+        return conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+    finally:
+        conn.close()
+
+def _safe(func, *args):
+    try:
+        return func(*args), None
+    except sqlite3.Error as exc:
+        return None, exc
+
+def _copy_user(conn, username):
+    conn.execute("ATTACH DATABASE ? AS src", (db.user_db_path(username),))
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        # Lookup tables are shared by every user in the store: only ever added to
+        for table in db.LOOKUPS.values():
+            conn.execute(f"INSERT OR IGNORE INTO main.{table} (name) SELECT name FROM src.{table} ORDER BY id")
+        for table, columns in TABLES.items():
+            order = " ORDER BY id" if table in ("recurring", "goals", "streaks", "achievements") else ""
+            source = SOURCES.get(table, f"SELECT {columns} FROM src.{table}{order}")
+            conn.execute(f"DELETE FROM main.{table} WHERE user_id = ?", (username,))
+            conn.execute(f"INSERT INTO main.{table} ({columns}) {source}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute("DETACH DATABASE src")
+
+def consolidate(users=None, target=None, workers=4, progress=None):
+    # Returns {"users", "records", "seconds", "failed": {username: error}}
+    users = users if users is not None else db.list_user_files()
+    target = target or db.SHARED_DB
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+
+    writer = sqlite3.connect(target, timeout=60)
+    writer.execute("PRAGMA journal_mode=WAL")
+    writer.execute("PRAGMA synchronous=NORMAL")
+    db._migrate(writer, None)
+
+    started = time.perf_counter()
+    stats = {"users": 0, "records": 0, "failed": {}}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        prepared = pool.map(lambda u: (u, _safe(_prepare, u)), users)
+        for username, (count, error) in prepared:
+            if error is None:
+                try:
+                    _copy_user(writer, username)
+                except sqlite3.Error as exc:
+                    error = exc
+            if error is not None:
+                stats["failed"][username] = str(error)
+                continue
+            stats["users"] += 1
+            stats["records"] += count
+            if progress:
+                progress(stats)
+    writer.close()
+    stats["seconds"] = time.perf_counter() - started
+    return stats
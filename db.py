@@ -1,29 +1,37 @@
-import sqlite3
-import pandas as pd
+import calendar
+import functools
+import hashlib
 import os
+import threading
 from datetime import date, datetime, timedelta
 
-# -------------- Currency Conversion (Mock) --------------
-def convert_to_base(amount, from_currency, to_currency):
-    rates = {"INR": 1, "USD": 83, "EUR": 90, "GBP": 100}
+import rates
+from cache import ReadCache
+from lazy import LazyModule
+from pool import ConnectionPool
+from profiling import profiler
+
+# Imported on first use (see lazy.py): batch jobs that never read a DataFrame skip them
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+
+# -------------- Currency Conversion --------------
+def convert_to_base(amount, from_currency, to_currency, on=None):
+    # Scalar convenience over rates.convert, at the rate in force on `on` (default today)
     if from_currency == to_currency:
         return amount
-    # Convert amount from from_currency to base currency
-    try:
-        converted_amount = amount * rates[from_currency] / rates[to_currency]
-    except KeyError:
-        # If currency not found, just return amount as fallback
-        converted_amount = amount
-    return converted_amount
+    return float(rates.convert([amount], [from_currency], [on or date.today()], to_currency)[0])
 
-# -------------- Init DBs per User --------------
-def create_user_db(username):
-    db_path = f"data/{username}.db"
-    os.makedirs("data", exist_ok=True)
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
+def convert_column(df, base, amount="amount", currency="currency", day="date"):
+    return rates.convert(df[amount].to_numpy(), df[currency].to_numpy(), df[day].to_numpy(dtype="datetime64[D]"), base)
 
-    # Core Tables
+# -------------- Schema + Migrations --------------
+# Each DB records its schema version in PRAGMA user_version. Migrations run in
+# order, once, inside a single transaction; every process checks a given DB
+# file only the first time it connects to it. Migrations receive the file's
+# owner (the username for per-user files, None for the shared store).
+
+def _migration_1_base_schema(c, owner):
     c.execute("""
         CREATE TABLE IF NOT EXISTS records (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -82,215 +90,1480 @@ def create_user_db(username):
     """)
     # Set default base currency
     c.execute("INSERT OR IGNORE INTO user_settings (key, value) VALUES ('base_currency', 'INR')")
+
+def _migration_2_aggregates(c, owner):
+    # Running aggregates over records, kept in step by every records insert
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS agg_totals (
+            type TEXT,
+            currency TEXT,
+            month TEXT,
+            amount REAL,
+            count INTEGER,
+            PRIMARY KEY (type, currency, month)
+        )
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS agg_category (
+            type TEXT,
+            category TEXT,
+            currency TEXT,
+            month TEXT,
+            amount REAL,
+            count INTEGER,
+            PRIMARY KEY (type, category, currency, month)
+        )
+    """)
+    # Backfilled by migration 8, after 6 and 7 replace these tables
+
+def _migration_3_indexes(c, owner):
+    # Indexes for the ORDER BY / WHERE columns used by the read paths
+    c.execute("CREATE INDEX IF NOT EXISTS idx_records_date ON records(date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_records_type_currency ON records(type, currency)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_goals_date ON goals(date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_recurring_next_due ON recurring(next_due)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_achievements_name ON achievements(name)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_achievements_date ON achievements(date)")
+
+def _migration_4_import_hash(c, owner):
+    # Content hash of imported statement rows; NULL for manually added records
+    c.execute("ALTER TABLE records ADD COLUMN import_hash TEXT")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_records_import_hash ON records(import_hash)")
+
+def _migration_5_streaks(c, owner):
+    # streaks was created in v1 but never written; one row per date from now on.
+    # Backfilled by migration 7.
+    c.execute("DELETE FROM streaks")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_streaks_date ON streaks(date)")
+
+def _migration_6_daily_aggregates(c, owner):
+    # Aggregates keyed by day instead of month, so amounts can be converted
+    # at the exchange rate in force on the day they were recorded
+    c.execute("DROP TABLE IF EXISTS agg_totals")
+    c.execute("DROP TABLE IF EXISTS agg_category")
+    c.execute("""
+        CREATE TABLE agg_totals (
+            type TEXT,
+            currency TEXT,
+            day TEXT,
+            amount REAL,
+            count INTEGER,
+            PRIMARY KEY (type, currency, day)
+        )
+    """)
+    c.execute("""
+        CREATE TABLE agg_category (
+            type TEXT,
+            category TEXT,
+            currency TEXT,
+            day TEXT,
+            amount REAL,
+            count INTEGER,
+            PRIMARY KEY (type, category, currency, day)
+        )
+    """)
+
+def _migration_7_user_id(c, owner):
+    # Every row carries its owner's user_id, so per-user files and the shared
+    # store use one schema and one set of queries
+    for table in ("records", "recurring", "goals", "streaks", "achievements"):
+        c.execute(f"ALTER TABLE {table} ADD COLUMN user_id TEXT")
+        c.execute(f"UPDATE {table} SET user_id = ?", (owner,))
+    for index in ("idx_records_date", "idx_records_type_currency", "idx_records_import_hash",
+                  "idx_goals_date", "idx_recurring_next_due", "idx_achievements_name",
+                  "idx_achievements_date", "idx_streaks_date"):
+        c.execute(f"DROP INDEX IF EXISTS {index}")
+    c.execute("CREATE INDEX idx_records_user_date ON records(user_id, date)")
+    c.execute("CREATE INDEX idx_records_user_type_currency ON records(user_id, type, currency)")
+    c.execute("CREATE UNIQUE INDEX idx_records_user_import_hash ON records(user_id, import_hash)")
+    c.execute("CREATE INDEX idx_goals_user_date ON goals(user_id, date)")
+    c.execute("CREATE INDEX idx_recurring_user_next_due ON recurring(user_id, next_due)")
+    c.execute("CREATE INDEX idx_achievements_user_name ON achievements(user_id, name)")
+    c.execute("CREATE INDEX idx_achievements_user_date ON achievements(user_id, date)")
+    c.execute("CREATE UNIQUE INDEX idx_streaks_user_date ON streaks(user_id, date)")
+
+    # Tables whose primary key has to lead with user_id are rebuilt
+    c.execute("ALTER TABLE user_settings RENAME TO user_settings_v6")
+    c.execute("""
+        CREATE TABLE user_settings (
+            user_id TEXT,
+            key TEXT,
+            value TEXT,
+            PRIMARY KEY (user_id, key)
+        )
+    """)
+    if owner is not None:
+        c.execute("INSERT INTO user_settings (user_id, key, value) SELECT ?, key, value FROM user_settings_v6", (owner,))
+    c.execute("DROP TABLE user_settings_v6")
+    c.execute("DROP TABLE agg_totals")
+    c.execute("DROP TABLE agg_category")
+    c.execute("""
+        CREATE TABLE agg_totals (
+            user_id TEXT,
+            type TEXT,
+            currency TEXT,
+            day TEXT,
+            amount REAL,
+            count INTEGER,
+            PRIMARY KEY (user_id, type, currency, day)
+        )
+    """)
+    c.execute("""
+        CREATE TABLE agg_category (
+            user_id TEXT,
+            type TEXT,
+            category TEXT,
+            currency TEXT,
+            day TEXT,
+            amount REAL,
+            count INTEGER,
+            PRIMARY KEY (user_id, type, category, currency, day)
+        )
+    """)
+    c.execute("CREATE TABLE tenants (user_id TEXT PRIMARY KEY)")
+    if owner is not None:
+        # Aggregates are rebuilt by migration 8
+        c.execute("INSERT INTO tenants (user_id) VALUES (?)", (owner,))
+        _rebuild_streaks(c, owner)
+
+def _migration_8_month_aggregates(c, owner):
+    # Monthly rollup next to the daily tables: whole-history and month-window
+    # reads scan a row per month instead of one per day
+    c.execute("""
+        CREATE TABLE agg_month (
+            user_id TEXT,
+            type TEXT,
+            category TEXT,
+            currency TEXT,
+            month TEXT,
+            amount REAL,
+            count INTEGER,
+            PRIMARY KEY (user_id, type, category, currency, month)
+        ) WITHOUT ROWID
+    """)
+    if owner is not None:
+        # Per-user files coming from v6 or earlier reach here with empty daily
+        # aggregates (migration 7 recreated them); fill them from records
+        for table, cols in (("agg_totals", "type, currency"), ("agg_category", "type, category, currency")):
+            c.execute(f"DELETE FROM {table}")
+            c.execute(f"""
+                INSERT INTO {table} (user_id, {cols}, day, amount, count)
+                SELECT user_id, {cols}, date, SUM(amount), COUNT(*)
+                FROM records
+                GROUP BY user_id, {cols}, date
+            """)
+    c.execute("""
+        INSERT INTO agg_month (user_id, type, category, currency, month, amount, count)
+        SELECT user_id, type, category, currency, substr(day, 1, 7), SUM(amount), SUM(count)
+        FROM agg_category
+        GROUP BY user_id, type, category, currency, substr(day, 1, 7)
+    """)
+
+def _migration_9_archive(c, owner):
+    # Bookkeeping for months moved out to Arrow files by archive.py: which
+    # months (and which file holds each), the aggregate contribution of the
+    # archived rows so aggregates can still be rebuilt, and their import
+    # hashes so re-imports keep skipping them
+    c.execute("""
+        CREATE TABLE archived_months (
+            user_id TEXT,
+            month TEXT,
+            file TEXT,
+            rows INTEGER,
+            PRIMARY KEY (user_id, month)
+        ) WITHOUT ROWID
+    """)
+    c.execute("""
+        CREATE TABLE archive_agg (
+            user_id TEXT,
+            type TEXT,
+            category TEXT,
+            currency TEXT,
+            day TEXT,
+            amount REAL,
+            count INTEGER,
+            PRIMARY KEY (user_id, type, category, currency, day)
+        ) WITHOUT ROWID
+    """)
+    c.execute("""
+        CREATE TABLE archive_hashes (
+            user_id TEXT,
+            import_hash TEXT,
+            PRIMARY KEY (user_id, import_hash)
+        ) WITHOUT ROWID
+    """)
+
+LOOKUPS = {"category": "categories", "type": "record_types", "currency": "currencies"}
+
+def _migration_10_lookup_codes(c, owner):
+    # records stores small integer codes for category, type and currency,
+    # backed by one lookup table each; records_named joins the names back for
+    # the SQL that groups by them. Rebuilt rather than altered so the text
+    # columns are really gone from disk.
+    for table in LOOKUPS.values():
+        c.execute(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+    c.execute("INSERT INTO record_types (name) VALUES ('Income'), ('Expense')")
+    for column, table in LOOKUPS.items():
+        c.execute(f"""
+            INSERT OR IGNORE INTO {table} (name)
+            SELECT DISTINCT {column} FROM records WHERE {column} IS NOT NULL ORDER BY {column}
+        """)
+    c.execute("SELECT seq FROM sqlite_sequence WHERE name = 'records'")
+    row = c.fetchone()
+    c.execute("""
+        CREATE TABLE records_v10 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT,
+            date TEXT,
+            category_id INTEGER REFERENCES categories(id),
+            amount REAL,
+            type_id INTEGER REFERENCES record_types(id),
+            description TEXT,
+            currency_id INTEGER REFERENCES currencies(id),
+            import_hash TEXT
+        )
+    """)
+    c.execute("""
+        INSERT INTO records_v10 (id, user_id, date, category_id, amount, type_id, description, currency_id, import_hash)
+        SELECT r.id, r.user_id, r.date, c.id, r.amount, t.id, r.description, cu.id, r.import_hash
+        FROM records r
+        LEFT JOIN categories c ON c.name = r.category
+        LEFT JOIN record_types t ON t.name = r.type
+        LEFT JOIN currencies cu ON cu.name = r.currency
+    """)
+    c.execute("DROP TABLE records")
+    c.execute("ALTER TABLE records_v10 RENAME TO records")
+    if row:
+        # Keep ids freed by archiving from being handed out again
+        c.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'records'", (row[0],))
+    c.execute("CREATE INDEX idx_records_user_date ON records(user_id, date)")
+    c.execute("CREATE INDEX idx_records_user_type_currency ON records(user_id, type_id, currency_id)")
+    c.execute("CREATE UNIQUE INDEX idx_records_user_import_hash ON records(user_id, import_hash)")
+    c.execute("""
+        CREATE VIEW records_named AS
+        SELECT r.id, r.user_id, r.date, c.name AS category, r.amount, t.name AS type,
+               r.description, cu.name AS currency, r.import_hash
+        FROM records r
+        LEFT JOIN categories c ON c.id = r.category_id
+        LEFT JOIN record_types t ON t.id = r.type_id
+        LEFT JOIN currencies cu ON cu.id = r.currency_id
+    """)
+
+def _migration_11_unique_achievements(c, owner):
+    # One row per user and badge, so unlocks can be plain INSERT OR IGNOREs.
+    # Duplicates left by the old check-then-insert keep their earliest unlock.
+    c.execute("""
+        DELETE FROM achievements WHERE rowid NOT IN (
+            SELECT rowid FROM (
+                SELECT rowid, ROW_NUMBER() OVER (PARTITION BY user_id, name ORDER BY date, rowid) AS n
+                FROM achievements
+            ) WHERE n = 1
+        )
+    """)
+    c.execute("DROP INDEX IF EXISTS idx_achievements_user_name")
+    c.execute("CREATE UNIQUE INDEX idx_achievements_user_name ON achievements(user_id, name)")
+
+def _migration_12_search(c, owner):
+    # Contentless FTS5 index over description and category name, keyed by
+    # records.id; search_records joins back to records for everything else.
+    # user_id is indexed too so the shared store can narrow a match to one
+    # user. A contentless table cannot read its text back, so the delete
+    # triggers hand it the old values to remove. The 2- and 3-character prefix
+    # indexes keep search-as-you-type cheap on the first keystrokes.
+    c.execute("""
+        CREATE VIRTUAL TABLE records_fts USING fts5(
+            description, category, user_id,
+            content='', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    """)
+    c.execute("""
+        INSERT INTO records_fts (rowid, description, category, user_id)
+        SELECT id, description, category, user_id FROM records_named
+    """)
+    c.execute("""
+        CREATE TRIGGER records_fts_insert AFTER INSERT ON records BEGIN
+            INSERT INTO records_fts (rowid, description, category, user_id)
+            VALUES (new.id, new.description, (SELECT name FROM categories WHERE id = new.category_id), new.user_id);
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER records_fts_delete AFTER DELETE ON records BEGIN
+            INSERT INTO records_fts (records_fts, rowid, description, category, user_id)
+            VALUES ('delete', old.id, old.description, (SELECT name FROM categories WHERE id = old.category_id), old.user_id);
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER records_fts_update AFTER UPDATE OF description, category_id, user_id ON records BEGIN
+            INSERT INTO records_fts (records_fts, rowid, description, category, user_id)
+            VALUES ('delete', old.id, old.description, (SELECT name FROM categories WHERE id = old.category_id), old.user_id);
+            INSERT INTO records_fts (rowid, description, category, user_id)
+            VALUES (new.id, new.description, (SELECT name FROM categories WHERE id = new.category_id), new.user_id);
+        END
+    """)
+
+MIGRATION_CHUNK = 10_000
+
+def _migration_13_content_hashes(c, owner):
+    # Rows written without an import_hash (manual adds, recurring rules) get a
+    # content hash, the same one the importer gives a statement row, so an
+    # export of them imported back is recognised. Rows are hashed by
+    # _hash_rows in id order, a chunk at a time: repeats of one row are
+    # numbered in the order they were added, skipping hashes already taken.
+    last_id = 0
+    after = {}  # user -> {content: next occurrence}, carried across chunks
+    while True:
+        c.execute("""
+            SELECT r.id, r.user_id, r.date, ca.name, r.amount, t.name, r.description, cu.name
+            FROM records r
+            LEFT JOIN categories ca ON ca.id = r.category_id
+            LEFT JOIN record_types t ON t.id = r.type_id
+            LEFT JOIN currencies cu ON cu.id = r.currency_id
+            WHERE r.id > ? AND r.import_hash IS NULL
+            ORDER BY r.id
+            LIMIT ?
+        """, (last_id, MIGRATION_CHUNK))
+        rows = c.fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        by_user = {}
+        for id_, user, day, category, amount, rtype, desc, currency in rows:
+            by_user.setdefault(user, []).append((id_, (day, category, amount or 0, rtype, desc, currency, None)))
+        for user, pending in by_user.items():
+            hashed = _hash_rows(c, user, [row for _, row in pending], after.setdefault(user, {}))
+            c.executemany("UPDATE records SET import_hash = ? WHERE id = ?",
+                          ((row[6], id_) for (id_, _), row in zip(pending, hashed)))
+
+MIGRATIONS = [
+    (1, _migration_1_base_schema),
+    (2, _migration_2_aggregates),
+    (3, _migration_3_indexes),
+    (4, _migration_4_import_hash),
+    (5, _migration_5_streaks),
+    (6, _migration_6_daily_aggregates),
+    (7, _migration_7_user_id),
+    (8, _migration_8_month_aggregates),
+    (9, _migration_9_archive),
+    (10, _migration_10_lookup_codes),
+    (11, _migration_11_unique_achievements),
+    (12, _migration_12_search),
+    (13, _migration_13_content_hashes),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+_schema_ready = set()
+_schema_locks = {}
+_schema_locks_guard = threading.Lock()
+
+def _migrate(conn, owner):
+    c = conn.cursor()
+    version = c.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return version
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        # Re-read under the write lock in case another process migrated first
+        version = c.execute("PRAGMA user_version").fetchone()[0]
+        for target, migration in MIGRATIONS:
+            if target > version:
+                migration(c, owner)
+                c.execute(f"PRAGMA user_version={target}")
+                version = target
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return version
+
+def _ensure_schema(path, owner):
+    if path in _schema_ready:
+        return
+    with _schema_locks_guard:
+        lock = _schema_locks.setdefault(path, threading.Lock())
+    with lock:
+        if path in _schema_ready:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = _pool.connect(path)
+        try:
+            _migrate(conn, owner)
+        finally:
+            conn.close()
+        _schema_ready.add(path)
+
+def get_schema_version(username):
+    conn = get_connection(username)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    conn.close()
+    return version
+
+# -------------- Storage Layout --------------
+# "per_user": one data/<username>.db file per user (the default).
+# "shared":   every user in data/expense_tracker.db, partitioned by user_id.
+# Selected with EXPENSE_TRACKER_STORAGE or configure_storage(); both layouts
+# use the same schema and queries, only the file a user maps to differs.
+STORAGE = os.environ.get("EXPENSE_TRACKER_STORAGE", "per_user")
+SHARED_DB = "data/expense_tracker.db"
+SHARED_SLOTS = 8  # pooled connections to the shared file; users hash onto them
+RESERVED_FILES = ("auth.db", "rates.db", os.path.basename(SHARED_DB))
+
+def configure_storage(mode, shared_db=None):
+    global STORAGE, SHARED_DB
+    if mode not in ("per_user", "shared"):
+        raise ValueError(f"Unknown storage mode: {mode!r}")
+    STORAGE = mode
+    if shared_db:
+        SHARED_DB = shared_db
+    close_connections()
+    _cache.clear()
+
+def user_db_path(username):
+    return f"data/{username}.db"
+
+def _locate(username):
+    # -> (path, owner, pool slot)
+    if STORAGE == "shared":
+        return SHARED_DB, None, hash(username) % SHARED_SLOTS
+    return user_db_path(username), username, 0
+
+# -------------- Init DBs per User --------------
+_tenants_ready = set()
+
+def create_user_db(username):
+    # Kept for callers that create a user up front; get_connection migrates lazily too
+    path, _, _ = _locate(username)
+    if (path, username) in _tenants_ready:
+        return
+    conn = get_connection(username)
+    conn.execute("INSERT OR IGNORE INTO tenants (user_id) VALUES (?)", (username,))
     conn.commit()
     conn.close()
+    _tenants_ready.add((path, username))
+
+# -------------- Connections --------------
+_pool = ConnectionPool(max_size=64)
+
+def configure_pool(max_size):
+    _pool.max_size = max_size
+
+def pool_stats():
+    return _pool.stats()
+
+def close_connections():
+    _pool.close_all()
+    _schema_ready.clear()
+    _tenants_ready.clear()
 
 def get_connection(username):
-    return sqlite3.connect(f"data/{username}.db", check_same_thread=False)
+    # Leased from the shared pool; conn.close() returns it
+    path, owner, slot = _locate(username)
+    _ensure_schema(path, owner)
+    return _pool.connect(path, slot)
+
+# -------------- Read Cache --------------
+# Read functions are memoised per user and invalidated by version: every write
+# function bumps the user's local counter, and SQLite's data_version covers
+# commits made by other processes (cron scheduler, maintenance CLI). Today's
+# date is part of the version too, since streaks, month windows and rate
+# lookups all move at midnight without any write, and so is rates.version(),
+# since converted totals change when new rates are loaded.
+_cache = ReadCache(max_bytes=64 * 1024 * 1024)
+_versions = {}
+_versions_lock = threading.Lock()
+
+def configure_cache(max_bytes=None, enabled=None):
+    if max_bytes is not None:
+        _cache.max_bytes = max_bytes
+    if enabled is not None:
+        _cache.enabled = enabled
+    _cache.clear()
+
+def cache_stats():
+    return _cache.stats()
+
+def data_version(username):
+    conn = get_connection(username)
+    external = conn.execute("PRAGMA data_version").fetchone()[0]
+    serial = conn.serial
+    conn.close()
+    return (_versions.get(username, 0), serial, external, date.today(), rates.version())
+
+def _bump_version(username):
+    with _versions_lock:
+        _versions[username] = _versions.get(username, 0) + 1
+
+def cached_read(func):
+    @functools.wraps(func)
+    def wrapper(username, *args, **kwargs):
+        key = (func.__name__, username, args, tuple(sorted(kwargs.items())))
+        return _cache.get(key, data_version(username), lambda: func(username, *args, **kwargs))
+    return wrapper
+
+def invalidates(func):
+    @functools.wraps(func)
+    def wrapper(username, *args, **kwargs):
+        try:
+            return func(username, *args, **kwargs)
+        finally:
+            _bump_version(username)
+    return wrapper
+
+def list_user_files():
+    # Users that have a per-user file, whatever the configured layout
+    if not os.path.isdir("data"):
+        return []
+    return sorted(
+        name[:-3] for name in os.listdir("data")
+        if name.endswith(".db") and name not in RESERVED_FILES
+    )
+
+def list_users():
+    if STORAGE != "shared":
+        return list_user_files()
+    if not os.path.exists(SHARED_DB):
+        return []
+    _ensure_schema(SHARED_DB, None)
+    conn = _pool.connect(SHARED_DB)
+    users = [r[0] for r in conn.execute("SELECT user_id FROM tenants ORDER BY user_id")]
+    conn.close()
+    return users
+
+# -------------- Aggregates --------------
+def _update_aggregates(c, user, rows):
+    # rows: (date, category, amount, type, currency); must run inside the caller's transaction
+    c.executemany("""
+        INSERT INTO agg_totals (user_id, type, currency, day, amount, count)
+        VALUES (?, ?, ?, ?, ?, 1)
+        ON CONFLICT(user_id, type, currency, day) DO UPDATE
+        SET amount = amount + excluded.amount, count = count + 1
+    """, [(user, rtype, currency, d, amount) for d, _, amount, rtype, currency in rows])
+    c.executemany("""
+        INSERT INTO agg_category (user_id, type, category, currency, day, amount, count)
+        VALUES (?, ?, ?, ?, ?, ?, 1)
+        ON CONFLICT(user_id, type, category, currency, day) DO UPDATE
+        SET amount = amount + excluded.amount, count = count + 1
+    """, [(user, rtype, category, currency, d, amount) for d, category, amount, rtype, currency in rows])
+    c.executemany("""
+        INSERT INTO agg_month (user_id, type, category, currency, month, amount, count)
+        VALUES (?, ?, ?, ?, ?, ?, 1)
+        ON CONFLICT(user_id, type, category, currency, month) DO UPDATE
+        SET amount = amount + excluded.amount, count = count + 1
+    """, [(user, rtype, category, currency, d[:7], amount) for d, category, amount, rtype, currency in rows])
+
+def _update_aggregates_since(c, user, last_id):
+    # Folds the user's records with id > last_id into the aggregates in two grouped statements
+    c.execute("""
+        INSERT INTO agg_totals (user_id, type, currency, day, amount, count)
+        SELECT user_id, type, currency, date, SUM(amount), COUNT(*)
+        FROM records_named
+        WHERE id > ? AND user_id = ?
+        GROUP BY type, currency, date
+        ON CONFLICT(user_id, type, currency, day) DO UPDATE
+        SET amount = amount + excluded.amount, count = count + excluded.count
+    """, (last_id, user))
+    c.execute("""
+        INSERT INTO agg_category (user_id, type, category, currency, day, amount, count)
+        SELECT user_id, type, category, currency, date, SUM(amount), COUNT(*)
+        FROM records_named
+        WHERE id > ? AND user_id = ?
+        GROUP BY type, category, currency, date
+        ON CONFLICT(user_id, type, category, currency, day) DO UPDATE
+        SET amount = amount + excluded.amount, count = count + excluded.count
+    """, (last_id, user))
+    c.execute("""
+        INSERT INTO agg_month (user_id, type, category, currency, month, amount, count)
+        SELECT user_id, type, category, currency, substr(date, 1, 7), SUM(amount), COUNT(*)
+        FROM records_named
+        WHERE id > ? AND user_id = ?
+        GROUP BY type, category, currency, substr(date, 1, 7)
+        ON CONFLICT(user_id, type, category, currency, month) DO UPDATE
+        SET amount = amount + excluded.amount, count = count + excluded.count
+    """, (last_id, user))
+
+def _rebuild_aggregates(c, user):
+    c.execute("DELETE FROM agg_totals WHERE user_id = ?", (user,))
+    c.execute("DELETE FROM agg_category WHERE user_id = ?", (user,))
+    c.execute("DELETE FROM agg_month WHERE user_id = ?", (user,))
+    c.execute("""
+        INSERT INTO agg_totals (user_id, type, currency, day, amount, count)
+        SELECT user_id, type, currency, date, SUM(amount), COUNT(*)
+        FROM records_named
+        WHERE user_id = ?
+        GROUP BY type, currency, date
+    """, (user,))
+    c.execute("""
+        INSERT INTO agg_category (user_id, type, category, currency, day, amount, count)
+        SELECT user_id, type, category, currency, date, SUM(amount), COUNT(*)
+        FROM records_named
+        WHERE user_id = ?
+        GROUP BY type, category, currency, date
+    """, (user,))
+    c.execute("""
+        INSERT INTO agg_month (user_id, type, category, currency, month, amount, count)
+        SELECT user_id, type, category, currency, month, SUM(amount), SUM(count)
+        FROM (SELECT user_id, type, category, currency, substr(day, 1, 7) AS month, amount, count
+              FROM agg_category WHERE user_id = ?)
+        GROUP BY type, category, currency, month
+    """, (user,))
+
+def _add_archived_aggregates(c, user):
+    # Adds archive_agg (rows moved out by archive.py) back onto freshly rebuilt aggregates
+    c.execute("""
+        INSERT INTO agg_totals (user_id, type, currency, day, amount, count)
+        SELECT user_id, type, currency, day, SUM(amount), SUM(count)
+        FROM archive_agg
+        WHERE user_id = ?
+        GROUP BY type, currency, day
+        ON CONFLICT(user_id, type, currency, day) DO UPDATE
+        SET amount = amount + excluded.amount, count = count + excluded.count
+    """, (user,))
+    c.execute("""
+        INSERT INTO agg_category (user_id, type, category, currency, day, amount, count)
+        SELECT user_id, type, category, currency, day, amount, count
+        FROM archive_agg
+        WHERE user_id = ?
+        ON CONFLICT(user_id, type, category, currency, day) DO UPDATE
+        SET amount = amount + excluded.amount, count = count + excluded.count
+    """, (user,))
+    c.execute("""
+        INSERT INTO agg_month (user_id, type, category, currency, month, amount, count)
+        SELECT user_id, type, category, currency, month, SUM(amount), SUM(count)
+        FROM (SELECT user_id, type, category, currency, substr(day, 1, 7) AS month, amount, count
+              FROM archive_agg WHERE user_id = ?)
+        GROUP BY type, category, currency, month
+        ON CONFLICT(user_id, type, category, currency, month) DO UPDATE
+        SET amount = amount + excluded.amount, count = count + excluded.count
+    """, (user,))
+
+@invalidates
+def rebuild_aggregates(username):
+    create_user_db(username)
+    conn = get_connection(username)
+    c = conn.cursor()
+    _rebuild_aggregates(c, username)
+    _add_archived_aggregates(c, username)
+    conn.commit()
+    conn.close()
+
+def verify_aggregates(username, tolerance=1e-6):
+    # Returns a list of (table, key, stored, expected) for every bucket that drifted
+    create_user_db(username)
+    conn = get_connection(username)
+    c = conn.cursor()
+    checks = [
+        ("agg_totals", "type, currency", "day", "date"),
+        ("agg_category", "type, category, currency", "day", "date"),
+        ("agg_month", "type, category, currency", "month", "substr(date, 1, 7)"),
+    ]
+    drift = []
+    for table, cols, bucket, expr in checks:
+        c.execute(f"SELECT {cols}, {bucket}, amount, count FROM {table} WHERE user_id = ?", (username,))
+        stored = {tuple(r[:-2]): (r[-2], r[-1]) for r in c.fetchall()}
+        # Archived rows only survive as archive_agg, so they count towards the expectation
+        c.execute(f"""
+            SELECT {cols}, {expr}, SUM(amount), SUM(n)
+            FROM (SELECT type, category, currency, date, amount, 1 AS n FROM records_named WHERE user_id = ?
+                  UNION ALL
+                  SELECT type, category, currency, day, amount, count FROM archive_agg WHERE user_id = ?)
+            GROUP BY {cols}, {expr}
+        """, (username, username))
+        expected = {tuple(r[:-2]): (r[-2], r[-1]) for r in c.fetchall()}
+        for k in stored.keys() | expected.keys():
+            got, want = stored.get(k, (0.0, 0)), expected.get(k, (0.0, 0))
+            if got[1] != want[1] or abs((got[0] or 0.0) - (want[0] or 0.0)) > tolerance:
+                drift.append((table, k, got, want))
+    conn.close()
+    return drift
 
 # -------------- Records --------------
+# category, type and currency are stored as codes into the LOOKUPS tables.
+# Writers go through _insert_records; readers decode the codes into pandas
+# categoricals (_decode_records) or query records_named.
+
+def _lookup_codes(c, column, names):
+    # {name: code} for `names`, adding any the lookup table has not seen yet
+    table = LOOKUPS[column]
+    names = sorted({n for n in names if n is not None})
+    if not names:
+        return {}
+    c.executemany(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", ((n,) for n in names))
+    c.execute(f"SELECT name, id FROM {table} WHERE name IN ({','.join('?' * len(names))})", names)
+    return dict(c.fetchall())
+
+def row_hash(row, occurrence):
+    # Content hash of (date, category, amount, type, description, currency);
+    # occurrence separates genuinely repeated rows (two identical coffees on one day)
+    key = "\x1f".join(map(str, row)) + f"\x1f{occurrence}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+def _stored_hashes(c, username, digests):
+    # The subset of `digests` already stored for the user, hot or archived, in IN-list rounds
+    digests = list(digests)
+    found = set()
+    for start in range(0, len(digests), 500):
+        chunk = digests[start:start + 500]
+        marks = ",".join("?" * len(chunk))
+        c.execute(f"""
+            SELECT import_hash FROM records WHERE user_id = ? AND import_hash IN ({marks})
+            UNION ALL SELECT import_hash FROM archive_hashes WHERE user_id = ? AND import_hash IN ({marks})
+        """, (username, *chunk, username, *chunk))
+        found.update(r[0] for r in c.fetchall())
+    return found
+
+def _hash_rows(c, username, rows, after=None):
+    # Gives rows without an import_hash their content hash, at the first
+    # occurrence not already stored (hot or archived) or used in this batch, so
+    # they always go in and an export of them imported back is recognised.
+    # Repeats of one row take the free occurrences in row order. Each round
+    # checks a window of occurrences per row content, sized from the share
+    # found free in the last one (doubled when none were). after: optional
+    # {content: first occurrence to try}, updated in place, for callers that
+    # hash rows in consecutive batches.
+    after = {} if after is None else after
+    rows = list(rows)
+    unavailable = {row[6] for row in rows if row[6] is not None}
+    waiting = {}  # content -> indexes of the rows still to hash, last row first
+    for i in range(len(rows) - 1, -1, -1):
+        d, category, amount, rtype, desc, currency, digest = rows[i]
+        if digest is None:
+            content = (str(d), category, float(amount), rtype, desc or "", currency)
+            if content in waiting:
+                waiting[content].append(i)
+            else:
+                waiting[content] = [i]
+    # content -> (first occurrence, window size, rows still to hash) for this round
+    windows = {content: (after.get(content, 0), len(indexes), len(indexes)) for content, indexes in waiting.items()}
+    while windows:
+        probes = [(content, occurrence, row_hash(content, occurrence))
+                  for content, (start, size, _) in windows.items() for occurrence in range(start, start + size)]
+        unavailable |= _stored_hashes(c, username, {digest for _, _, digest in probes} - unavailable)
+        for content, occurrence, digest in probes:
+            indexes = waiting[content]
+            if indexes and digest not in unavailable:
+                i = indexes.pop()
+                rows[i] = rows[i][:6] + (digest,)
+                unavailable.add(digest)
+                after[content] = occurrence + 1
+        retry = {}
+        for content, (start, size, pending) in windows.items():
+            left = len(waiting[content])
+            if left:
+                # Every free occurrence in the window was taken up
+                assigned = pending - left
+                retry[content] = (start + size, -(-left * size // assigned) if assigned else size * 2, left)
+        windows = retry
+    return rows
+
+def _check_currencies(currencies):
+    # Rows in a currency with no exchange rate could never be converted into
+    # the base currency, so writers refuse them up front
+    unknown = set(currencies) - set(rates.currencies())
+    if unknown:
+        raise ValueError(f"No exchange rate for currency {min(unknown)!r}")
+
+def _insert_records(c, username, rows):
+    # rows: (date, category, amount, type, description, currency, import_hash); runs in the
+    # caller's transaction. Rows whose import_hash is already stored, hot or archived, are
+    # skipped; rows without one get their content hash (_hash_rows). Returns the number inserted.
+    rows = _hash_rows(c, username, [tuple(row) for row in rows])
+    codes = {column: _lookup_codes(c, column, (row[i] for row in rows))
+             for column, i in (("category", 1), ("type", 3), ("currency", 5))}
+    # rowcount, unlike total_changes, leaves out the rows the search triggers write
+    c.executemany("""
+        INSERT OR IGNORE INTO records (user_id, date, category_id, amount, type_id, description, currency_id, import_hash)
+        SELECT ?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8
+        WHERE NOT EXISTS (SELECT 1 FROM archive_hashes WHERE user_id = ?1 AND import_hash = ?8)
+    """, ((username, d, codes["category"].get(category), amount, codes["type"].get(rtype), desc,
+           codes["currency"].get(currency), import_hash)
+          for d, category, amount, rtype, desc, currency, import_hash in rows))
+    return max(c.rowcount, 0)
+
+def _decode_records(c, df):
+    # Code columns (selected as category/type/currency) -> categoricals over the
+    # lookup names; ISO date strings -> datetime64. Run after reading the rows so
+    # every code in them is already in the lookup tables.
+    for column, table in LOOKUPS.items():
+        if column not in df:
+            continue
+        c.execute(f"SELECT id, name FROM {table} ORDER BY id")
+        lookup = c.fetchall()
+        position = np.full(max((i for i, _ in lookup), default=0) + 1, -1, dtype=np.int64)
+        position[[i for i, _ in lookup]] = np.arange(len(lookup))
+        codes = position[df[column].fillna(0).to_numpy(dtype=np.int64)]
+        df[column] = pd.Categorical.from_codes(codes, categories=[n for _, n in lookup]).remove_unused_categories()
+    if "date" in df:
+        df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d", errors="coerce")
+    return df
+
+@invalidates
 def add_record(username, category, amount, record_type, description, currency):
+    _check_currencies([currency])
     create_user_db(username)
     conn = get_connection(username)
     c = conn.cursor()
     today = date.today().isoformat()
-    c.execute("""
-        INSERT INTO records (date, category, amount, type, description, currency)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (today, category, amount, record_type, description, currency))
+    _insert_records(c, username, [(today, category, amount, record_type, description, currency, None)])
+    _update_aggregates(c, username, [(today, category, amount, record_type, currency)])
+    if record_type == "Income":
+        _evaluate_achievements(conn, username, "income")
     conn.commit()
     conn.close()
 
-def get_records(username):
-    create_user_db(username)
+@invalidates
+def add_records(username, rows):
+    # Bulk insert in one transaction. rows: (date, category, amount, type, description, currency, import_hash).
+    # Rows whose import_hash already exists are skipped; returns the number inserted.
+    rows = [tuple(row) for row in rows]
+    _check_currencies(row[5] for row in rows)
     conn = get_connection(username)
-    df = pd.read_sql("SELECT * FROM records ORDER BY date DESC", conn)
+    c = conn.cursor()
+    # Take the write lock first so no other writer can slip rows in above last_id
+    c.execute("BEGIN IMMEDIATE")
+    c.execute("SELECT COALESCE(MAX(id), 0) FROM records")
+    last_id = c.fetchone()[0]
+    inserted = _insert_records(c, username, rows)
+    if inserted:
+        _update_aggregates_since(c, username, last_id)
+        if any(row[3] == "Income" for row in rows):
+            _evaluate_achievements(conn, username, "income")
+    conn.commit()
     conn.close()
+    return inserted
+
+def _record_filters(username, start_date=None, end_date=None, category=None, record_type=None, currency=None,
+                    coded=True):
+    # coded: filter records' lookup codes; otherwise the name columns (the aggregates)
+    clauses, params = ["user_id = ?"], [username]
+    if start_date:
+        clauses.append("date >= ?")
+        params.append(str(start_date))
+    if end_date:
+        clauses.append("date <= ?")
+        params.append(str(end_date))
+    for column, value in (("category", category), ("type", record_type), ("currency", currency)):
+        if value:
+            if coded:
+                clauses.append(f"{column}_id = (SELECT id FROM {LOOKUPS[column]} WHERE name = ?)")
+            else:
+                clauses.append(f"{column} = ?")
+            params.append(value)
+    return clauses, params
+
+def _archived_files(c, username, start_date=None, end_date=None, cursor=None):
+    # Archive files (newest month first) that can hold rows in the date range;
+    # months outside it are never opened
+    clauses, params = ["user_id = ?"], [username]
+    if start_date:
+        clauses.append("month >= ?")
+        params.append(str(start_date)[:7])
+    upper = min((str(d)[:7] for d in (end_date, cursor[0] if cursor else None) if d), default=None)
+    if upper:
+        clauses.append("month <= ?")
+        params.append(upper)
+    c.execute(f"SELECT file FROM archived_months WHERE {' AND '.join(clauses)} ORDER BY month DESC", params)
+    return [r[0] for r in c.fetchall()]
+
+@cached_read
+def get_records(username, page_size=None, cursor=None, start_date=None, end_date=None,
+                category=None, record_type=None, currency=None):
+    # Newest first. With page_size, pass the (date, id) of the last row of the
+    # previous page as cursor to get the next one (keyset pagination).
+    # Archived months (archive.py) are merged in transparently.
+    clauses, params = _record_filters(username, start_date, end_date, category, record_type, currency)
+    if cursor is not None:
+        clauses.append("(date, id) < (?, ?)")
+        params.extend([str(cursor[0]), int(cursor[1])])
+    sql = ("SELECT id, date, category_id AS category, amount, type_id AS type, description,"
+           " currency_id AS currency FROM records")
+    sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY date DESC, id DESC"
+    if page_size:
+        sql += " LIMIT ?"
+        params.append(int(page_size))
+    conn = get_connection(username)
+    c = conn.cursor()
+    df = _decode_records(c, pd.read_sql(sql, conn, params=params))
+    lower = start_date
+    if page_size and len(df) == page_size:
+        # A full hot page: only archived rows that outrank its last row matter
+        lower = max(str(start_date or ""), df["date"].iloc[-1].date().isoformat())
+    files = _archived_files(c, username, lower, end_date, cursor)
+    conn.close()
+    if files:
+        import archive
+        cold = archive.read_records(files, limit=page_size, start_date=lower, end_date=end_date,
+                                    category=category, record_type=record_type, currency=currency, cursor=cursor)
+        if not cold.empty:
+            df = cold if df.empty else _concat_records(df, cold)
+            df = df.sort_values(["date", "id"], ascending=False, ignore_index=True)
+            df = df.head(page_size) if page_size else df
+    return df
+
+def _concat_records(*frames):
+    # pd.concat falls back to object for categoricals with different categories
+    df = pd.concat(frames, ignore_index=True)
+    for column in LOOKUPS:
+        df[column] = df[column].astype("category")
     return df
 
+def records_cursor(page):
+    # Cursor for the page after this one, or None when it was the last page
+    if page.empty:
+        return None
+    last = page.iloc[-1]
+    return (pd.Timestamp(last["date"]).date().isoformat(), int(last["id"]))
+
+@cached_read
+def count_records(username, start_date=None, end_date=None, category=None, record_type=None, currency=None):
+    scan = bool(start_date or end_date or category)
+    clauses, params = _record_filters(username, start_date, end_date, category, record_type, currency, coded=scan)
+    conn = get_connection(username)
+    c = conn.cursor()
+    if not scan:
+        # type/currency-only filters are answered from the running aggregates
+        sql = "SELECT COALESCE(SUM(count), 0) FROM agg_totals"
+    else:
+        sql = "SELECT COUNT(*) FROM records"
+    sql += " WHERE " + " AND ".join(clauses)
+    c.execute(sql, params)
+    total = c.fetchone()[0]
+    # The aggregates already include archived rows; a records count does not
+    files = _archived_files(c, username, start_date, end_date) if scan else []
+    conn.close()
+    if files:
+        import archive
+        total += archive.count_records(files, start_date=start_date, end_date=end_date,
+                                       category=category, record_type=record_type, currency=currency)
+    return total
+
+EXPORT_BATCH = 10_000
+
+def export_records(username):
+    # Every record as (date, category, amount, type, description, currency, import_hash):
+    # archived months first, then the rows still in SQLite, each by date. Hot
+    # rows are read in keyset batches so the connection is not held while the
+    # caller writes them out.
+    conn = get_connection(username)
+    c = conn.cursor()
+    c.execute("SELECT file FROM archived_months WHERE user_id = ? ORDER BY month", (username,))
+    files = [r[0] for r in c.fetchall()]
+    conn.close()
+    if files:
+        import archive
+        yield from archive.iter_rows(files, ["date", "category", "amount", "type", "description", "currency",
+                                             "import_hash"])
+    last = ("", 0)
+    while True:
+        conn = get_connection(username)
+        rows = conn.execute("""
+            SELECT date, category, amount, type, description, currency, import_hash, id
+            FROM records_named
+            WHERE user_id = ? AND (date, id) > (?, ?)
+            ORDER BY date, id
+            LIMIT ?
+        """, (username, *last, EXPORT_BATCH)).fetchall()
+        conn.close()
+        if not rows:
+            return
+        yield from (row[:-1] for row in rows)
+        last = (rows[-1][0], rows[-1][-1])
+
+# -------------- Search --------------
+# records_fts (migration 12) indexes description and category name and is kept
+# in step with records by triggers. Archived months are not indexed: search
+# covers the rows still in SQLite. bm25 has to score every match before it can
+# sort, so only the newest SEARCH_WINDOW matches (after filters) are ranked;
+# that keeps a word found in most of a million rows in the tens of ms.
+SEARCH_COLUMNS = ["id", "date", "category", "amount", "type", "description", "currency", "rank"]
+SEARCH_WINDOW = 2000
+
+def _match_query(text, user=None):
+    # Free text -> FTS5 query. Every word must match, the last one as a prefix so
+    # results follow typing (from its second character: a one-letter prefix
+    # expands to most of the vocabulary); words are quoted so "[Recurring]" or
+    # "AND" are plain text, not syntax. user narrows the match in the shared store.
+    words = [t for t in text.split() if any(ch.isalnum() for ch in t)]
+    if not words:
+        return None
+    terms = " ".join('"' + t.replace('"', '""') + '"' for t in words)
+    match = "{description category} : (" + terms + ("*" if len(words[-1]) > 1 else "") + ")"
+    if user is not None:
+        match = 'user_id : "' + user.replace('"', '""') + '" AND ' + match
+    return match
+
+def search_records(username, query, filters=None, limit=50, offset=0):
+    # Best bm25 match first (lower rank is better), `limit` rows from `offset`.
+    # filters: get_records' keyword filters (start_date, end_date, category, record_type, currency).
+    return _search_records(username, query, tuple(sorted((filters or {}).items())), int(limit), int(offset))
+
+@cached_read
+def _search_records(username, query, filters, limit, offset):
+    _, owner, _ = _locate(username)
+    match = _match_query(query, username if owner is None else None)
+    if match is None:
+        return pd.DataFrame(columns=SEARCH_COLUMNS)
+    clauses, params = _record_filters(username, **dict(filters))
+    sql = f"""
+        WITH hits AS (
+            SELECT f.rowid AS id, f.rank AS rank
+            FROM records_fts f
+            JOIN records r ON r.id = f.rowid
+            WHERE records_fts MATCH ? AND {" AND ".join("r." + clause for clause in clauses)}
+            ORDER BY f.rowid DESC
+            LIMIT ?
+        )
+        SELECT r.id, r.date, r.category_id AS category, r.amount, r.type_id AS type, r.description,
+               r.currency_id AS currency, h.rank AS rank
+        FROM hits h
+        JOIN records r ON r.id = h.id
+        ORDER BY h.rank, r.id DESC
+        LIMIT ? OFFSET ?
+    """
+    conn = get_connection(username)
+    try:
+        return _decode_records(conn.cursor(), pd.read_sql(
+            sql, conn, params=[match, *params, SEARCH_WINDOW, limit, offset]))
+    finally:
+        conn.close()
+
 # -------------- Recurring --------------
+@invalidates
 def add_recurring_transaction(username, category, amount, record_type, description, frequency, start_date, currency):
+    _check_currencies([currency])
     conn = get_connection(username)
     c = conn.cursor()
     c.execute("""
-        INSERT INTO recurring (category, amount, type, description, frequency, start_date, next_due, currency)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (category, amount, record_type, description, frequency, start_date, start_date, currency))
+        INSERT INTO recurring (user_id, category, amount, type, description, frequency, start_date, next_due, currency)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (username, category, amount, record_type, description, frequency, start_date, start_date, currency))
     conn.commit()
     conn.close()
 
-def process_due_recurring_transactions(username):
+def next_occurrence(current, frequency, anchor_day):
+    # Monthly rules keep the start date's day, clamped to the month's length
+    if frequency == "daily":
+        return current + timedelta(days=1)
+    if frequency == "weekly":
+        return current + timedelta(weeks=1)
+    year = current.year + current.month // 12
+    month = current.month % 12 + 1
+    return date(year, month, min(anchor_day, calendar.monthrange(year, month)[1]))
+
+@invalidates
+def process_due_recurring_transactions(username, today=None):
+    # Generates every missed occurrence, each dated on its due date, in one transaction.
+    # Returns the number of records created.
+    today = today or date.today()
+    due_sql = """
+        SELECT id, category, amount, type, description, frequency, start_date, next_due, currency
+        FROM recurring
+        WHERE user_id = ? AND next_due <= ?
+    """
     conn = get_connection(username)
     c = conn.cursor()
-    today = date.today()
+    if not c.execute(due_sql, (username, today.isoformat())).fetchone():
+        conn.close()
+        return 0
+    # Re-read under the write lock so a concurrent run cannot generate the same rows
+    c.execute("BEGIN IMMEDIATE")
+    due = c.execute(due_sql, (username, today.isoformat())).fetchall()
 
-    c.execute("SELECT * FROM recurring")
-    for row in c.fetchall():
-        id_, category, amount, rtype, desc, freq, start, next_due, currency = row
-        next_due_date = datetime.strptime(next_due, "%Y-%m-%d").date()
-
-        if today >= next_due_date:
-            c.execute("""
-                INSERT INTO records (date, category, amount, type, description, currency)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (today.isoformat(), category, amount, rtype, f"[Recurring] {desc}", currency))
-
-            # Schedule next
-            if freq == "daily":
-                new_due = next_due_date + timedelta(days=1)
-            elif freq == "weekly":
-                new_due = next_due_date + timedelta(weeks=1)
-            else:
-                new_month = next_due_date.month % 12 + 1
-                new_year = next_due_date.year + (next_due_date.month // 12)
-                new_day = min(next_due_date.day, 28)
-                new_due = date(new_year, new_month, new_day)
+    rows, updates = [], []
+    for id_, category, amount, rtype, desc, freq, start, next_due, currency in due:
+        anchor_day = datetime.strptime(start or next_due, "%Y-%m-%d").day
+        occurrence = datetime.strptime(next_due, "%Y-%m-%d").date()
+        while occurrence <= today:
+            rows.append((occurrence.isoformat(), category, amount, rtype, f"[Recurring] {desc}", currency, None))
+            occurrence = next_occurrence(occurrence, freq, anchor_day)
+        updates.append((occurrence.isoformat(), id_))
 
-            c.execute("UPDATE recurring SET next_due=? WHERE id=?", (new_due.isoformat(), id_))
+    c.execute("SELECT COALESCE(MAX(id), 0) FROM records")
+    last_id = c.fetchone()[0]
+    _insert_records(c, username, rows)
+    _update_aggregates_since(c, username, last_id)
+    if any(row[3] == "Income" for row in rows):
+        _evaluate_achievements(conn, username, "income")
+    c.executemany("UPDATE recurring SET next_due=? WHERE id=?", updates)
     conn.commit()
     conn.close()
+    return len(rows)
 
+@cached_read
 def get_recurring_transactions(username):
     conn = get_connection(username)
-    df = pd.read_sql("SELECT * FROM recurring ORDER BY next_due", conn)
+    df = pd.read_sql("""
+        SELECT id, category, amount, type, description, frequency, start_date, next_due, currency
+        FROM recurring
+        WHERE user_id = ?
+        ORDER BY next_due
+    """, conn, params=(username,))
     conn.close()
+    for column in ("category", "type", "frequency", "currency"):
+        df[column] = df[column].astype("category")
     return df
 
 # -------------- Goals + Streaks --------------
+# streaks holds one row per distinct goal-update date with the length of the
+# run of consecutive days ending on it. log_goal_history extends it by one row;
+# set_goal (which clears goals) recomputes it in one vectorised pass.
+
+def compute_streaks(dates):
+    # dates: iterable of ISO strings, any order, duplicates allowed -> (dates, streaks) arrays
+    days = np.unique(np.asarray(list(dates), dtype="datetime64[D]"))
+    if days.size == 0:
+        return days, np.zeros(0, dtype=np.int64)
+    breaks = np.ones(days.size, dtype=bool)
+    breaks[1:] = np.diff(days).astype(np.int64) != 1
+    run_start = np.maximum.accumulate(np.where(breaks, np.arange(days.size), 0))
+    return days, np.arange(days.size) - run_start + 1
+
+def _rebuild_streaks(c, user):
+    c.execute("SELECT date FROM goals WHERE user_id = ?", (user,))
+    days, streaks = compute_streaks(r[0] for r in c.fetchall())
+    c.execute("DELETE FROM streaks WHERE user_id = ?", (user,))
+    c.executemany("INSERT INTO streaks (user_id, date, streak) VALUES (?, ?, ?)",
+                  ((user, d, n) for d, n in zip(days.astype(str).tolist(), streaks.tolist())))
+
+def _extend_streak(c, user, day):
+    c.execute("SELECT 1 FROM streaks WHERE user_id = ? AND date = ?", (user, day.isoformat()))
+    if c.fetchone():
+        return
+    c.execute("SELECT streak FROM streaks WHERE user_id = ? AND date = ?", (user, (day - timedelta(days=1)).isoformat()))
+    row = c.fetchone()
+    c.execute("INSERT INTO streaks (user_id, date, streak) VALUES (?, ?, ?)",
+              (user, day.isoformat(), row[0] + 1 if row else 1))
+
+@invalidates
 def set_goal(username, goal):
     conn = get_connection(username)
     today = date.today().isoformat()
     c = conn.cursor()
-    c.execute("DELETE FROM goals")
-    c.execute("INSERT INTO goals (date, goal) VALUES (?, ?)", (today, goal))
+    c.execute("DELETE FROM goals WHERE user_id = ?", (username,))
+    c.execute("INSERT INTO goals (user_id, date, goal) VALUES (?, ?, ?)", (username, today, goal))
+    _rebuild_streaks(c, username)
+    _evaluate_achievements(conn, username, "goals")
     conn.commit()
     conn.close()
 
+@cached_read
 def get_goal(username):
     conn = get_connection(username)
     c = conn.cursor()
-    c.execute("SELECT goal FROM goals ORDER BY id DESC LIMIT 1")
+    c.execute("SELECT goal FROM goals WHERE user_id = ? ORDER BY id DESC LIMIT 1", (username,))
     row = c.fetchone()
     conn.close()
     return row[0] if row else 0.0
 
+@invalidates
 def log_goal_history(username, goal):
     conn = get_connection(username)
-    today = date.today().isoformat()
+    today = date.today()
     c = conn.cursor()
-    c.execute("INSERT INTO goals (date, goal) VALUES (?, ?)", (today, goal))
+    c.execute("INSERT INTO goals (user_id, date, goal) VALUES (?, ?, ?)", (username, today.isoformat(), goal))
+    _extend_streak(c, username, today)
+    _evaluate_achievements(conn, username, "goals")
     conn.commit()
     conn.close()
 
+@cached_read
 def get_goal_history(username):
     conn = get_connection(username)
-    df = pd.read_sql("SELECT date, goal FROM goals ORDER BY date", conn)
+    df = pd.read_sql("SELECT date, goal FROM goals WHERE user_id = ? ORDER BY date", conn, params=(username,))
     conn.close()
+    df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d")
     return df
 
+@cached_read
+def get_streak_stats(username):
+    # current (run ending today), best, and per-day growth from the precomputed table
+    conn = get_connection(username)
+    growth = pd.read_sql("SELECT date AS Date, streak AS Streak FROM streaks WHERE user_id = ? ORDER BY date",
+                         conn, params=(username,))
+    conn.close()
+    today = date.today().isoformat()
+    current = int(growth["Streak"].iloc[-1]) if not growth.empty and growth["Date"].iloc[-1] == today else 0
+    best = int(growth["Streak"].max()) if not growth.empty else 0
+    growth["Date"] = pd.to_datetime(growth["Date"]).dt.date
+    return {"current": current, "best": best, "growth": growth}
+
+@cached_read
 def get_streak(username):
     conn = get_connection(username)
-    df = pd.read_sql("SELECT date FROM goals ORDER BY date DESC", conn)
+    c = conn.cursor()
+    c.execute("SELECT streak FROM streaks WHERE user_id = ? AND date = ?", (username, date.today().isoformat()))
+    row = c.fetchone()
     conn.close()
-    streak = 0
-    today = date.today()
-    for i in range(len(df)):
-        d = datetime.strptime(df.iloc[i]["date"], "%Y-%m-%d").date()
-        if d == today - timedelta(days=streak):
-            streak += 1
-        else:
-            break
-    return streak
+    return row[0] if row else 0
 
+@cached_read
 def get_best_streak(username):
     conn = get_connection(username)
-    df = pd.read_sql("SELECT date FROM goals ORDER BY date", conn)
+    c = conn.cursor()
+    c.execute("SELECT COALESCE(MAX(streak), 0) FROM streaks WHERE user_id = ?", (username,))
+    best = c.fetchone()[0]
     conn.close()
-    best, current = 0, 0
-    prev = None
-    for i in range(len(df)):
-        d = datetime.strptime(df.iloc[i]["date"], "%Y-%m-%d").date()
-        if prev is None or d == prev + timedelta(days=1):
-            current += 1
-        else:
-            best = max(best, current)
-            current = 1
-        prev = d
-    return max(best, current)
+    return best
 
 def get_streak_growth(username):
+    return get_streak_stats(username)["growth"]
+
+# -------------- Chart Series --------------
+# get_goal_history / get_streak_growth return every row ever written. The
+# series functions below return at most `points` rows for a date range,
+# downsampled here, so a chart costs the same whatever the history length.
+SERIES_POINTS = 500
+
+def downsample(x, y, points):
+    # Indexes (ascending) of the rows to keep from a series sorted by x: the x
+    # range is split into equal-width buckets and each bucket keeps its lowest
+    # and highest row, plus the first and last row overall, so peaks, resets
+    # and steps all survive. One vectorised pass (a lexsort), no per-bucket loop.
+    n = len(x)
+    if n <= points:
+        return np.arange(n)
+    if points <= 2:
+        return np.array([0, n - 1][:max(points, 0)], dtype=np.int64)
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype("datetime64[s]").astype(np.int64)
+    y = np.asarray(y, dtype=np.float64)
+    buckets = max((points - 2) // 2, 1)
+    span = max(int(x[-1] - x[0]), 1)
+    bucket = np.minimum((x - x[0]) * buckets // span, buckets - 1)
+    order = np.lexsort((y, bucket))  # by bucket, then value
+    ranked = bucket[order]
+    first = np.flatnonzero(np.r_[True, ranked[1:] != ranked[:-1]])
+    last = np.r_[first[1:] - 1, n - 1]
+    keep = np.unique(np.r_[0, order[first], order[last], n - 1])
+    if len(keep) > points:
+        # Only when points == 3: one bucket's two extremes plus both ends
+        keep = np.r_[keep[:points - 1], n - 1]
+    return keep
+
+def _series(username, sql, x, y, points, start_date, end_date):
+    clauses, params = ["user_id = ?"], [username]
+    if start_date:
+        clauses.append("date >= ?")
+        params.append(str(start_date))
+    if end_date:
+        clauses.append("date <= ?")
+        params.append(str(end_date))
     conn = get_connection(username)
-    df = pd.read_sql("SELECT date FROM goals ORDER BY date", conn)
+    df = pd.read_sql(sql.format(where=" AND ".join(clauses)), conn, params=params)
     conn.close()
-    streaks, current, prev = [], 0, None
-    for i in range(len(df)):
-        d = datetime.strptime(df.iloc[i]["date"], "%Y-%m-%d").date()
-        current = current + 1 if prev and d == prev + timedelta(days=1) else 1
-        streaks.append({"Date": d, "Streak": current})
-        prev = d
-    return pd.DataFrame(streaks)
+    df[x] = pd.to_datetime(df[x], format="%Y-%m-%d")
+    keep = downsample(df[x].to_numpy(), df[y].to_numpy(), points)
+    return df.iloc[keep].reset_index(drop=True)
+
+@cached_read
+def get_goal_series(username, points=SERIES_POINTS, start_date=None, end_date=None):
+    # Goal over time (date, goal), at most `points` rows
+    return _series(username, "SELECT date, goal FROM goals WHERE {where} ORDER BY date, id",
+                   "date", "goal", points, start_date, end_date)
+
+@cached_read
+def get_streak_series(username, points=SERIES_POINTS, start_date=None, end_date=None):
+    # Streak length over time (Date, Streak), at most `points` rows
+    return _series(username, "SELECT date AS Date, streak AS Streak FROM streaks WHERE {where} ORDER BY date",
+                   "Date", "Streak", points, start_date, end_date)
 
 # -------------- Income/Expense Totals (converted) --------------
+@cached_read
 def get_base_currency(username):
     conn = get_connection(username)
     c = conn.cursor()
-    c.execute("SELECT value FROM user_settings WHERE key='base_currency'")
+    c.execute("SELECT value FROM user_settings WHERE user_id = ? AND key='base_currency'", (username,))
     val = c.fetchone()
     conn.close()
     return val[0] if val else "INR"
 
-def get_total_income(username):
+@cached_read
+def get_totals(username):
     conn = get_connection(username)
-    df = pd.read_sql("SELECT amount, currency FROM records WHERE type='Income'", conn)
-    conn.close()
-    base = get_base_currency(username)
-    return round(sum(convert_to_base(r["amount"], r["currency"], base) for _, r in df.iterrows()), 2)
+    try:
+        return _totals(conn, username)
+    finally:
+        conn.close()
+
+def _totals(conn, username):
+    # Sums the monthly rollup and converts it in one vectorised pass. Months in
+    # which a relevant exchange rate changes mid-month are read from the daily
+    # aggregates instead, so every amount still uses the rate on its own day.
+    # Rows in a currency without exchange rates (stored before writers checked)
+    # are left out and listed under "unconverted" rather than failing the page.
+    # Uncached, so write transactions (achievement rules) see their own rows.
+    c = conn.cursor()
+    c.execute("SELECT value FROM user_settings WHERE user_id = ? AND key='base_currency'", (username,))
+    val = c.fetchone()
+    base = val[0] if val else "INR"
+    df = pd.read_sql("""
+        SELECT type, currency, month, SUM(amount) AS amount
+        FROM agg_month
+        WHERE user_id = ? AND type IN ('Income', 'Expense')
+        GROUP BY type, currency, month
+    """, conn, params=(username,))
+    changing = frozenset()
+    if not df.empty:
+        currencies = tuple(sorted(set(df["currency"]) | {base}))
+        changing = rates.changing_months(currencies, f"{df['month'].min()}-01", f"{df['month'].max()}-31")
+    df["day"] = df["month"] + "-01"
+    if changing:
+        marks = ",".join("?" * len(changing))
+        daily = pd.read_sql(f"""
+            SELECT type, currency, day, amount
+            FROM agg_totals
+            WHERE user_id = ? AND type IN ('Income', 'Expense') AND substr(day, 1, 7) IN ({marks})
+        """, conn, params=(username, *sorted(changing)))
+        df = pd.concat([df[~df["month"].isin(changing)], daily], ignore_index=True)
+    known = df["currency"].isin(rates.currencies())
+    unconverted = sorted(set(df.loc[~known, "currency"]))
+    df = df[known]
+    df = df.assign(converted=convert_column(df, base, day="day"))
+    sums = df.groupby("type")["converted"].sum()
+    income = round(float(sums.get("Income", 0.0)), 2)
+    expenses = round(float(sums.get("Expense", 0.0)), 2)
+    return {"income": income, "expenses": expenses, "savings": round(income - expenses, 2), "base": base,
+            "unconverted": unconverted}
+
+def get_total_income(username):
+    return get_totals(username)["income"]
 
 def get_total_expenses(username):
-    conn = get_connection(username)
-    df = pd.read_sql("SELECT amount, currency FROM records WHERE type='Expense'", conn)
-    conn.close()
-    base = get_base_currency(username)
-    return round(sum(convert_to_base(r["amount"], r["currency"], base) for _, r in df.iterrows()), 2)
+    return get_totals(username)["expenses"]
 
 # -------------- Achievements --------------
+# Badges are declared as rules: check(conn, user) returns the unlock date (ISO)
+# or None, and `on` names the kinds of write that can change the answer. The
+# writers call _evaluate_achievements inside their own transaction, so pages
+# only ever read the achievements table.
+ACHIEVEMENTS = {}  # name -> (events, check)
+
+def achievement(name, on):
+    def register(check):
+        ACHIEVEMENTS[name] = (frozenset(on), check)
+        return check
+    return register
+
+@achievement("First Goal Set", on=("goals",))
+def _first_goal(conn, user):
+    return conn.execute("SELECT MIN(date) FROM goals WHERE user_id = ?", (user,)).fetchone()[0]
+
+@achievement("7-Day Streak", on=("goals",))
+def _week_streak(conn, user):
+    return conn.execute("SELECT MIN(date) FROM streaks WHERE user_id = ? AND streak >= 7", (user,)).fetchone()[0]
+
+@achievement("Saved ₹10,000", on=("income", "settings"))
+def _income_10k(conn, user):
+    return date.today().isoformat() if _totals(conn, user)["income"] >= 10000 else None
+
+def _evaluate_achievements(conn, user, event=None):
+    # Runs the rules listening for `event` (all of them when None) that the user
+    # has not unlocked yet; returns the names unlocked. Must run in the caller's transaction.
+    held = {r[0] for r in conn.execute("SELECT name FROM achievements WHERE user_id = ?", (user,))}
+    unlocked = []
+    for name, (events, check) in ACHIEVEMENTS.items():
+        if name in held or (event is not None and event not in events):
+            continue
+        day = check(conn, user)
+        if day is not None:
+            conn.execute("INSERT OR IGNORE INTO achievements (user_id, name, date) VALUES (?, ?, ?)",
+                         (user, name, day))
+            unlocked.append(name)
+    return unlocked
+
+@invalidates
 def unlock_achievement(username, name):
     conn = get_connection(username)
-    c = conn.cursor()
-    c.execute("SELECT * FROM achievements WHERE name=?", (name,))
-    if not c.fetchone():
-        c.execute("INSERT INTO achievements (name, date) VALUES (?, ?)", (name, date.today().isoformat()))
+    conn.execute("INSERT OR IGNORE INTO achievements (user_id, name, date) VALUES (?, ?, ?)",
+                 (username, name, date.today().isoformat()))
     conn.commit()
     conn.close()
 
+@invalidates
+def backfill_achievements(username):
+    # Evaluates every rule against the user's existing data; returns the names unlocked
+    create_user_db(username)
+    conn = get_connection(username)
+    conn.execute("BEGIN IMMEDIATE")
+    unlocked = _evaluate_achievements(conn, username)
+    conn.commit()
+    conn.close()
+    return unlocked
+
+@cached_read
 def get_achievements(username):
     conn = get_connection(username)
-    df = pd.read_sql("SELECT name, date FROM achievements ORDER BY date", conn)
+    df = pd.read_sql("SELECT name, date FROM achievements WHERE user_id = ? ORDER BY date", conn, params=(username,))
     conn.close()
     return df
 
 # -------------- Budget Prediction --------------
-def get_monthly_spending_by_category(username):
+def _month_window(months, today=None):
+    # ["YYYY-MM", ...] for the last `months` calendar months, oldest first
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1
+    return [f"{i // 12:04d}-{i % 12 + 1:02d}" for i in range(index - months + 1, index + 1)]
+
+@cached_read
+def get_monthly_spending_by_category(username, months=6):
+    # Expense per month x category for the last `months` calendar months, in the
+    # base currency, read from the monthly rollup. As in _totals, months in which
+    # a relevant rate changes mid-month come from the daily aggregates, so every
+    # amount is converted at the rate on its own day.
+    window = _month_window(months)
+    base = get_base_currency(username)
     conn = get_connection(username)
     df = pd.read_sql("""
-        SELECT strftime('%Y-%m', date) AS month, category, amount, currency
-        FROM records
-        WHERE type='Expense'
-    """, conn)
-    base = get_base_currency(username)
-    df["converted"] = df.apply(lambda r: float(convert_to_base(float(r["amount"]), r["currency"], base)), axis=1)
-    pivot = df.groupby(["month", "category"])["converted"].sum().unstack(fill_value=0)
+        SELECT month, category, currency, amount
+        FROM agg_month
+        WHERE user_id = ? AND type='Expense' AND month >= ?
+    """, conn, params=(username, window[0]))
+    changing = frozenset()
+    if not df.empty:
+        currencies = tuple(sorted(set(df["currency"]) | {base}))
+        changing = rates.changing_months(currencies, f"{window[0]}-01", f"{window[-1]}-31")
+    df["day"] = df["month"] + "-01"
+    if changing:
+        marks = ",".join("?" * len(changing))
+        daily = pd.read_sql(f"""
+            SELECT substr(day, 1, 7) AS month, category, currency, day, amount
+            FROM agg_category
+            WHERE user_id = ? AND type='Expense' AND substr(day, 1, 7) IN ({marks})
+        """, conn, params=(username, *sorted(changing)))
+        df = pd.concat([df[~df["month"].isin(changing)], daily], ignore_index=True)
     conn.close()
-    return pivot.tail(6)  # Last 6 months
+    # Rows in a currency without exchange rates cannot be converted; get_totals reports them
+    df = df[df["currency"].isin(rates.currencies())]
+    if df.empty:
+        return pd.DataFrame()
+    df = df.assign(converted=convert_column(df, base, day="day"))
+    pivot = df.pivot_table(index="month", columns="category", values="converted", aggfunc="sum", fill_value=0)
+    return pivot.reindex(window, fill_value=0)
 
+@invalidates
 def set_base_currency(username, currency):
+    _check_currencies([currency])
     conn = get_connection(username)
     c = conn.cursor()
     c.execute("""
-        INSERT INTO user_settings (key, value) 
-        VALUES ('base_currency', ?)
-        ON CONFLICT(key) DO UPDATE SET value=excluded.value
-    """, (currency,))
+        INSERT INTO user_settings (user_id, key, value)
+        VALUES (?, 'base_currency', ?)
+        ON CONFLICT(user_id, key) DO UPDATE SET value=excluded.value
+    """, (username, currency))
+    _evaluate_achievements(conn, username, "settings")
     conn.commit()
     conn.close()
 
+# -------------- Instrumentation --------------
+# Every public function above goes through profiler.wrap; it only records while
+# profiling is enabled and a run is active (see profiling.py).
+def configure_profiling(enabled=None, log_path=None):
+    profiler.configure(enabled=enabled, log_path=log_path)
+
+_pool.observer = profiler
+rates._pool.observer = profiler
+profiler.instrument(globals(), exclude={
+    "cached_read", "invalidates", "data_version", "row_hash",
+    "configure_storage", "configure_pool", "configure_cache", "configure_profiling",
+    "pool_stats", "cache_stats", "achievement",
+})
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+# -------------- Spending Forecast --------------
+# Holt's linear exponential smoothing, run for every category at once: the
+# history is a (months x categories) matrix and each smoothing step updates a
+# whole row. Smoothing parameters are picked per category from a small grid by
+# one-step-ahead squared error, also evaluated for all categories together.
+
+ALPHAS = np.array([0.2, 0.4, 0.6, 0.8])
+BETAS = np.array([0.0, 0.1, 0.3])
+Z_95 = 1.96
+
+def _holt(y, alpha, beta, horizon=1):
+    # y: (T, K); alpha, beta broadcastable to (K,). Returns (forecast `horizon`
+    # steps past the last row, one-step errors)
+    level = y[0].copy()
+    trend = (y[1] - y[0]) if len(y) > 1 else np.zeros_like(level)
+    errors = np.zeros((max(len(y) - 1, 0), y.shape[1]))
+    for t in range(1, len(y)):
+        predicted = level + trend
+        errors[t - 1] = y[t] - predicted
+        new_level = alpha * y[t] + (1 - alpha) * predicted
+        trend = beta * (new_level - level) + (1 - beta) * trend
+        level = new_level
+    return level + horizon * trend, errors
+
+def forecast_next_month(history, horizon=1):
+    # history: DataFrame indexed by month, one column per category (as returned by
+    # db.get_monthly_spending_by_category), complete months only. Returns one row
+    # per category with the forecast for `horizon` months after the last row and
+    # a ~95% prediction interval. Leading months with no spending at all are
+    # padding from the month window, not observations, and are dropped.
+    columns = ["forecast", "lower", "upper", "last"]
+    y = history.to_numpy(dtype=np.float64)
+    active = np.flatnonzero(y.any(axis=1)) if y.size else []
+    if len(active) == 0:
+        return pd.DataFrame(columns=columns)
+    y = y[active[0]:]
+    categories = history.columns
+
+    if len(y) < 3:
+        # Too short to fit a trend: carry the mean forward
+        mean = y.mean(axis=0)
+        spread = y.std(axis=0) * Z_95
+        point, lower, upper = mean, mean - spread, mean + spread
+    else:
+        best_sse = np.full(y.shape[1], np.inf)
+        point = np.zeros(y.shape[1])
+        sigma = np.zeros(y.shape[1])
+        for alpha in ALPHAS:
+            for beta in BETAS:
+                pred, errors = _holt(y, alpha, beta, horizon)
+                # The first error only reflects the trend initialisation
+                sse = (errors[1:] ** 2).sum(axis=0)
+                better = sse < best_sse
+                best_sse = np.where(better, sse, best_sse)
+                point = np.where(better, pred, point)
+                sigma = np.where(better, np.sqrt(sse / max(len(errors) - 1, 1) * horizon), sigma)
+        lower, upper = point - Z_95 * sigma, point + Z_95 * sigma
+
+    result = pd.DataFrame({
+        "forecast": np.clip(point, 0, None),
+        "lower": np.clip(lower, 0, None),
+        "upper": np.clip(upper, 0, None),
+        "last": y[-1],
+    }, index=categories)
+    result.index.name = "category"
+    return result.round(2)
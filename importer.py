@@ -0,0 +1,180 @@
+import csv
+import io
+import sqlite3
+import time
+from collections import Counter
+from datetime import datetime
+
+import db
+import rates
+
+# -------------- Bank Statement Import --------------
+# Statements are read as a stream and inserted CHUNK_SIZE rows at a time, each
+# chunk in one transaction via db.add_records, so memory stays bounded by the
+# chunk however long the file is. Every row carries a content hash;
+# re-importing an overlapping statement skips the rows already present.
+# Repeated rows are numbered by occurrence across the whole file; the counts
+# live in a private on-disk temporary database, not in Python memory.
+
+CHUNK_SIZE = 50_000
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y", "%d-%m-%Y", "%Y%m%d", "%d %b %Y"]
+FIELDS = ["date", "amount", "category", "type", "description", "currency"]
+HASH_FIELD = "import_hash"  # read when present, e.g. in files written by `maintenance export`
+
+def parse_date(value, date_format=None):
+    value = value.strip()
+    formats = [date_format] if date_format else DATE_FORMATS
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date: {value!r}")
+
+def parse_amount(value):
+    value = value.strip().replace(",", "")
+    if value.startswith("(") and value.endswith(")"):
+        value = "-" + value[1:-1]
+    return float(value)
+
+def _text_stream(fileobj):
+    # Streamlit uploads and open(..., "rb") both hand us bytes
+    if isinstance(fileobj, io.TextIOBase):
+        return fileobj
+    return io.TextIOWrapper(fileobj, encoding="utf-8-sig", errors="replace", newline="")
+
+def read_csv_header(fileobj):
+    stream = _text_stream(fileobj)
+    header = next(csv.reader(stream), [])
+    if stream is not fileobj:
+        # Leave the underlying upload open for the import pass
+        stream.detach()
+    fileobj.seek(0)
+    return header
+
+# -------------- Row Sources --------------
+def iter_csv(fileobj, mapping):
+    # mapping: field -> CSV column name (missing/None fields use the defaults)
+    reader = csv.DictReader(_text_stream(fileobj))
+    for row in reader:
+        yield {field: row.get(column) for field, column in mapping.items() if column}
+
+def iter_ofx(fileobj):
+    # Handles both SGML (unclosed tags) and XML OFX; one <STMTTRN> per record
+    currency, txn = None, None
+    for line in _text_stream(fileobj):
+        for token in line.split("<")[1:]:
+            tag, _, value = token.partition(">")
+            tag, value = tag.strip().upper(), value.strip()
+            if tag == "CURDEF":
+                currency = value
+            elif tag == "STMTTRN":
+                txn = {}
+            elif tag == "/STMTTRN" and txn is not None:
+                yield {
+                    "date": txn.get("DTPOSTED", "")[:8],
+                    "amount": txn.get("TRNAMT", "0"),
+                    "description": txn.get("NAME") or txn.get("MEMO") or "",
+                    "currency": txn.get("CURRENCY") or currency,
+                }
+                txn = None
+            elif txn is not None and value and not tag.startswith("/"):
+                txn[tag] = value
+
+# -------------- Occurrence Counts --------------
+class _Occurrences:
+    # How often each normalised row has been seen so far in this file, keyed by
+    # its first-occurrence hash. "" opens a temporary database that SQLite
+    # deletes on close; its page cache is bounded and spills to disk.
+    def __init__(self):
+        self.conn = sqlite3.connect("")
+        self.conn.execute("CREATE TABLE seen (key TEXT PRIMARY KEY, n INTEGER NOT NULL) WITHOUT ROWID")
+
+    def number(self, rows):
+        # -> the occurrence of each row in `rows`, continuing from earlier calls
+        keys = [db.row_hash(row, 0) for row in rows]
+        distinct = list(dict.fromkeys(keys))
+        counts = {}
+        for start in range(0, len(distinct), 500):
+            part = distinct[start:start + 500]
+            counts.update(self.conn.execute(
+                f"SELECT key, n FROM seen WHERE key IN ({','.join('?' * len(part))})", part))
+        local = Counter()
+        occurrences = []
+        for key in keys:
+            occurrences.append(counts.get(key, 0) + local[key])
+            local[key] += 1
+        self.conn.executemany(
+            "INSERT INTO seen (key, n) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET n = n + excluded.n",
+            local.items())
+        return occurrences
+
+    def close(self):
+        self.conn.close()
+
+# -------------- Normalisation --------------
+def _normalise(raw, defaults, date_format, known_currencies):
+    amount = parse_amount(raw.get("amount") or "0")
+    rtype = (raw.get("type") or "").strip().title()
+    if rtype in ("Credit", "Cr", "Deposit"):
+        rtype = "Income"
+    elif rtype in ("Debit", "Dr", "Withdrawal"):
+        rtype = "Expense"
+    elif rtype not in ("Income", "Expense"):
+        # No usable type column: the sign decides
+        rtype = "Expense" if amount < 0 else "Income"
+    currency = (raw.get("currency") or "").strip().upper() or defaults["currency"]
+    if currency not in known_currencies:
+        raise ValueError(f"No exchange rate for currency {currency!r}")
+    return (
+        parse_date(raw.get("date") or "", date_format),
+        (raw.get("category") or "").strip() or defaults["category"],
+        abs(amount),
+        rtype,
+        (raw.get("description") or "").strip(),
+        currency,
+    )
+
+def import_records(username, fileobj, fmt="csv", mapping=None, defaults=None,
+                   date_format=None, chunk_size=CHUNK_SIZE, progress=None):
+    db.create_user_db(username)
+    defaults = {"category": "Other", "currency": "INR", **(defaults or {})}
+    source = iter_ofx(fileobj) if fmt == "ofx" else iter_csv(fileobj, mapping or {f: f for f in FIELDS + [HASH_FIELD]})
+
+    known_currencies = set(rates.currencies())
+    stats = {"rows": 0, "inserted": 0, "duplicates": 0, "skipped": 0}
+    started = time.perf_counter()
+    chunk = []  # (normalised row, import_hash from the file or None)
+    # Occurrences are counted per normalised row across the whole file, so
+    # repeated rows are told apart even when the file is not sorted by date
+    seen = _Occurrences()
+
+    def flush():
+        occurrences = seen.number([row for row, _ in chunk])
+        inserted = db.add_records(username, [row + (given or db.row_hash(row, occurrence),)
+                                             for (row, given), occurrence in zip(chunk, occurrences)])
+        stats["inserted"] += inserted
+        stats["duplicates"] += len(chunk) - inserted
+        chunk.clear()
+        if progress:
+            progress(stats)
+
+    try:
+        for raw in source:
+            stats["rows"] += 1
+            try:
+                row = _normalise(raw, defaults, date_format, known_currencies)
+            except ValueError:
+                stats["skipped"] += 1
+                continue
+            chunk.append((row, (raw.get(HASH_FIELD) or "").strip() or None))
+            if len(chunk) >= chunk_size:
+                flush()
+        if chunk:
+            flush()
+    finally:
+        seen.close()
+
+    stats["seconds"] = time.perf_counter() - started
+    stats["rows_per_sec"] = stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
@@ -0,0 +1,286 @@
+import atexit
+import logging
+import math
+import numbers
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from datetime import date
+
+import db
+import rates
+
+# -------------- Group-Commit Write Queue --------------
+# For programmatic feeds (card events, webhooks) where one commit per row is
+# the bottleneck. enqueue_*() hand the write to the database file's writer
+# thread and return a Future at once. The writer takes whatever is queued
+# (waiting up to LINGER for more, at most BATCH_ROWS items) and applies it
+# in one transaction with the same helpers as add_record, log_goal_history
+# and unlock_achievement: aggregates, streaks and achievement rules are
+# updated once per user per batch rather than per row.
+# Rows are validated before they are queued. If a batch still fails, its items
+# are retried one transaction each, so only the bad item's Future gets the
+# error. Each Future resolves after its commit (to the number of records
+# inserted, for records); flush() waits for everything queued so far. A Future
+# cancelled before the writer picks it up is dropped without being written.
+# A commit uses the pool's pragmas (WAL, synchronous=NORMAL): it survives an
+# app crash but not necessarily a power cut. flush(durable=True) also
+# checkpoints the WAL into the database file, which is synced to disk, before
+# returning. Each queue holds at most MAX_PENDING items. Past that, enqueue
+# blocks up to ENQUEUE_TIMEOUT and then raises IngestBusy.
+
+log = logging.getLogger(__name__)
+
+LINGER = 0.005  # seconds the writer waits for more items before committing
+BATCH_ROWS = 1000
+MAX_PENDING = 10_000
+ENQUEUE_TIMEOUT = 5.0
+
+class IngestBusy(RuntimeError):
+    pass
+
+_STOP = object()
+
+class _Writer:
+    # One thread and queue per database file (per user, or the shared file)
+    def __init__(self, path, username):
+        self.path = path
+        self.username = username  # any user stored in the file, to get a connection with
+        self.queue = queue.Queue(maxsize=MAX_PENDING)
+        self.batches = 0
+        self.items = 0
+        self.unsynced = False  # committed since the last durable flush
+        self.thread = threading.Thread(target=self._run, name=f"ingest:{path}", daemon=True)
+        self.thread.start()
+
+    def put(self, item):
+        try:
+            self.queue.put(item, timeout=ENQUEUE_TIMEOUT)
+        except queue.Full:
+            raise IngestBusy(f"Write queue for {self.path} is full; try again shortly.") from None
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + LINGER
+        while len(batch) < BATCH_ROWS and batch[-1] is not _STOP and batch[-1][0] != "flush":
+            try:
+                batch.append(self.queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is _STOP
+            # Items whose caller cancelled the Future are dropped; the rest can no
+            # longer be cancelled, so setting their results below cannot fail
+            items = [item for item in (batch[:-1] if stop else batch) if item[3].set_running_or_notify_cancel()]
+            try:
+                if items:
+                    self._apply(items)
+            except Exception as exc:
+                # Keep the writer alive: a dead one would leave every later Future unresolved
+                log.exception("ingest writer for %s failed on a batch of %d items", self.path, len(items))
+                for item in items:
+                    if not item[3].done():
+                        item[3].set_exception(exc)
+            if stop:
+                return
+
+    def _apply(self, items):
+        writes = [item for item in items if item[0] != "flush"]
+        if writes:
+            try:
+                results = self._commit(writes)
+            except Exception:
+                # One bad item fails the whole transaction: retry each on its own
+                log.warning("ingest batch of %d items failed for %s; retrying one by one",
+                            len(writes), self.path, exc_info=True)
+                for item in writes:
+                    try:
+                        result = self._commit([item]).get(0)
+                    except Exception as exc:
+                        item[3].set_exception(exc)
+                    else:
+                        item[3].set_result(result)
+            else:
+                # Delivered outside the try: nothing after the commit may reach the retry
+                for i, item in enumerate(writes):
+                    item[3].set_result(results.get(i))
+        for _, _, durable, future in (item for item in items if item[0] == "flush"):
+            try:
+                if durable and self.unsynced:
+                    self._sync()
+            except Exception as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(None)
+
+    def _commit(self, items):
+        # One transaction for `items`; -> {item index: result}
+        users = list(dict.fromkeys(username for _, username, _, _ in items))
+        try:
+            results = _write(users, items)
+        finally:
+            for username in users:
+                db._bump_version(username)
+        self.unsynced = True
+        self.batches += 1
+        self.items += len(items)
+        return results
+
+    def _sync(self):
+        # Copies the WAL into the database file, which SQLite fsyncs; FULL waits
+        # (up to the busy timeout) for readers still on older snapshots
+        conn = db.get_connection(self.username)
+        try:
+            busy, _, _ = conn.execute("PRAGMA wal_checkpoint(FULL)").fetchone()
+        finally:
+            conn.close()
+        if busy:
+            raise IngestBusy(f"Could not checkpoint {self.path}: readers kept it busy; try again shortly.")
+        self.unsynced = False
+
+def _write(users, items):
+    # Applies writes in one transaction; -> {item index: result}
+    by_user = defaultdict(lambda: defaultdict(list))
+    for i, (kind, username, payload, _) in enumerate(items):
+        by_user[username][kind].append((i, payload))
+    today = date.today()
+    results = {}
+    # Every user in a batch lives in the same file; in shared mode one connection serves them all
+    conn = db.get_connection(users[0])
+    try:
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        for username in users:
+            work = by_user[username]
+            events = set()
+            if work["record"]:
+                c.execute("SELECT COALESCE(MAX(id), 0) FROM records")
+                last_id = c.fetchone()[0]
+                # Rows without an import_hash always go in, so they share one insert;
+                # hashed rows go one at a time to learn which were duplicates
+                plain = [(i, row) for i, row in work["record"] if row[6] is None]
+                if plain:
+                    db._insert_records(c, username, [row for _, row in plain])
+                    results.update((i, 1) for i, _ in plain)
+                for i, row in work["record"]:
+                    if row[6] is not None:
+                        results[i] = db._insert_records(c, username, [row])
+                db._update_aggregates_since(c, username, last_id)
+                if any(row[3] == "Income" for _, row in work["record"]):
+                    events.add("income")
+            if work["goal"]:
+                c.executemany("INSERT INTO goals (user_id, date, goal) VALUES (?, ?, ?)",
+                              ((username, today.isoformat(), goal) for _, goal in work["goal"]))
+                db._extend_streak(c, username, today)
+                events.add("goals")
+            if work["achievement"]:
+                c.executemany("INSERT OR IGNORE INTO achievements (user_id, name, date) VALUES (?, ?, ?)",
+                              ((username, name, today.isoformat()) for _, name in work["achievement"]))
+            for event in sorted(events):
+                db._evaluate_achievements(conn, username, event)
+        conn.commit()
+    finally:
+        conn.close()
+    return results
+
+_writers = {}
+_lock = threading.Lock()
+
+def _submit(kind, username, payload):
+    path = db._locate(username)[0]
+    with _lock:
+        writer = _writers.get(path)
+        if writer is None:
+            writer = _writers[path] = _Writer(path, username)
+    future = Future()
+    writer.put((kind, username, payload, future))
+    return future
+
+# -------------- Public API --------------
+_currencies = frozenset()  # rates are only ever added, so this is re-read on a miss only
+
+def _known_currency(currency):
+    global _currencies
+    if currency not in _currencies:
+        _currencies = frozenset(rates.currencies())
+    return currency in _currencies
+
+def enqueue_record(username, category, amount, record_type, description, currency, day=None, import_hash=None):
+    # Queues one record, dated `day` (date or ISO string) or today. The Future
+    # resolves to 1, or 0 when import_hash was already stored. Raises ValueError
+    # here, before queueing, for a row the writer could not store.
+    if record_type not in ("Income", "Expense"):
+        raise ValueError(f"Unknown record type: {record_type!r}")
+    if isinstance(amount, bool) or not isinstance(amount, numbers.Real) or not math.isfinite(amount):
+        raise ValueError(f"Amount must be a finite number, not {amount!r}")
+    if not _known_currency(currency):
+        raise ValueError(f"No exchange rate for currency {currency!r}")
+    day = date.fromisoformat(day) if isinstance(day, str) else day
+    db.create_user_db(username)
+    row = (str(day or date.today()), category, float(amount), record_type, description, currency, import_hash)
+    return _submit("record", username, row)
+
+def enqueue_goal(username, goal):
+    # Queued counterpart of db.log_goal_history
+    db.create_user_db(username)
+    return _submit("goal", username, goal)
+
+def enqueue_achievement(username, name):
+    # Queued counterpart of db.unlock_achievement
+    db.create_user_db(username)
+    return _submit("achievement", username, name)
+
+def flush(username=None, timeout=None, durable=False):
+    # Waits until everything queued before this call (for `username`'s database,
+    # or every database) has been committed. Failures are reported on the
+    # items' own Futures. durable=True also checkpoints those commits into the
+    # database file, so they survive a power cut; raises IngestBusy if it cannot.
+    with _lock:
+        if username is None:
+            writers = list(_writers.values())
+        else:
+            writer = _writers.get(db._locate(username)[0])
+            writers = [writer] if writer else []
+    markers = []
+    for writer in writers:
+        future = Future()
+        writer.put(("flush", None, durable, future))
+        markers.append(future)
+    for future in markers:
+        future.result(timeout)
+
+def configure(linger=None, batch_rows=None, max_pending=None, enqueue_timeout=None):
+    # max_pending applies to writers started after the call
+    global LINGER, BATCH_ROWS, MAX_PENDING, ENQUEUE_TIMEOUT
+    if linger is not None:
+        LINGER = linger
+    if batch_rows is not None:
+        BATCH_ROWS = batch_rows
+    if max_pending is not None:
+        MAX_PENDING = max_pending
+    if enqueue_timeout is not None:
+        ENQUEUE_TIMEOUT = enqueue_timeout
+
+def stats():
+    with _lock:
+        return {writer.path: {"queued": writer.queue.qsize(), "batches": writer.batches, "items": writer.items}
+                for writer in _writers.values()}
+
+def close():
+    # Drains every queue, commits it and stops the writer threads
+    with _lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        if writer.thread.is_alive():
+            writer.queue.put(_STOP)
+    for writer in writers:
+        writer.thread.join()
+
+atexit.register(close)
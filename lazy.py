@@ -0,0 +1,29 @@
+import importlib
+import sys
+import threading
+
+# -------------- Deferred Heavy Imports --------------
+# pandas and numpy are most of a cold start. The core modules (db, rates,
+# cache, profiling) bind them as LazyModule proxies, and the real import runs
+# on the first attribute access. So a batch job that never builds a DataFrame,
+# such as listing users, running most recurring rules or checking a password,
+# never pays for it. After loading, the module's names are copied onto the
+# proxy, so later lookups of public names are plain attribute reads.
+
+class LazyModule:
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_lock"] = threading.Lock()
+
+    def __getattr__(self, attr):
+        with self._lock:
+            module = importlib.import_module(self._name)
+            self.__dict__.update((k, v) for k, v in vars(module).items() if not k.startswith("_"))
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}>"
+
+def loaded(name):
+    # True once something has actually imported `name`
+    return name in sys.modules
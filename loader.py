@@ -0,0 +1,99 @@
+from dataclasses import dataclass
+
+import pandas as pd
+
+import db
+
+# -------------- Page Data Loader --------------
+# Each page declares the reads it needs as {field: fn(username)} and gets back
+# a frozen snapshot the render code only reads from. load() runs all of a
+# page's reads on one pooled connection inside one read transaction: the
+# nested get_connection calls re-enter the lease instead of checking out
+# again, and every field sees the same committed state. Reads still go
+# through the versioned cache in db.py.
+
+@dataclass(frozen=True)
+class DashboardSnapshot:
+    base: str
+    income: float
+    expenses: float
+    savings: float
+    unconverted: list  # currencies left out of the totals for lack of exchange rates
+
+@dataclass(frozen=True)
+class ProfileSnapshot:
+    username: str
+    base: str
+    income: float
+    expenses: float
+    savings: float
+    unconverted: list
+
+@dataclass(frozen=True)
+class GoalsSnapshot:
+    goal: float
+    history: pd.DataFrame
+    streak: int
+    best: int
+    growth: pd.DataFrame
+
+@dataclass(frozen=True)
+class PredictionSnapshot:
+    base: str
+    goal: float
+    history: pd.DataFrame
+
+@dataclass(frozen=True)
+class RecurringSnapshot:
+    rules: pd.DataFrame
+
+@dataclass(frozen=True)
+class AchievementsSnapshot:
+    badges: pd.DataFrame
+
+def load(username, needs):
+    # needs: {field: fn(username)} -> {field: result}
+    conn = db.get_connection(username)
+    try:
+        conn.execute("BEGIN")
+        return {field: fn(username) for field, fn in needs.items()}
+    finally:
+        conn.rollback()  # read-only: nothing to keep
+        conn.close()
+
+# -------------- Pages --------------
+def dashboard(username):
+    totals = load(username, {"totals": db.get_totals})["totals"]
+    return DashboardSnapshot(totals["base"], totals["income"], totals["expenses"], totals["savings"],
+                             totals["unconverted"])
+
+def profile(username):
+    totals = load(username, {"totals": db.get_totals})["totals"]
+    return ProfileSnapshot(username, totals["base"], totals["income"], totals["expenses"], totals["savings"],
+                           totals["unconverted"])
+
+def goals(username, start_date=None, points=db.SERIES_POINTS):
+    # Charts get downsampled series (at most `points` rows from start_date on),
+    # the metrics come from their own indexed reads
+    data = load(username, {
+        "goal": db.get_goal,
+        "history": lambda u: db.get_goal_series(u, points, start_date),
+        "streak": db.get_streak,
+        "best": db.get_best_streak,
+        "growth": lambda u: db.get_streak_series(u, points, start_date),
+    })
+    return GoalsSnapshot(data["goal"], data["history"], data["streak"], data["best"], data["growth"])
+
+def prediction(username, months=12):
+    data = load(username, {
+        "base": db.get_base_currency,
+        "goal": db.get_goal,
+        "history": lambda u: db.get_monthly_spending_by_category(u, months=months),
+    })
+    return PredictionSnapshot(data["base"], data["goal"], data["history"])
+
+def recurring(username):
+    return RecurringSnapshot(load(username, {"rules": db.get_recurring_transactions})["rules"])
+
+def achievements(username):
+    return AchievementsSnapshot(load(username, {"badges": db.get_achievements})["badges"])
@@ -0,0 +1,199 @@
+# Offline maintenance and batch commands for the databases under data/.
+# Headless: nothing here imports streamlit, and pandas/numpy/pyarrow only load
+# for the commands that need them (see lazy.py; startup_check.py keeps it so).
+# Usage:  python -m maintenance list-users
+#         python -m maintenance migrate [--user NAME]
+#         python -m maintenance load-rates [PATH ...]
+#         python -m maintenance consolidate [--workers N]
+#         python -m maintenance run-recurring [--user NAME]
+#         python -m maintenance export --user NAME [--output PATH]
+#         python -m maintenance import --user NAME PATH [--format csv|ofx] [--date-format FMT]
+#         python -m maintenance verify-aggregates [--user NAME] [--fix]
+#         python -m maintenance rebuild-aggregates [--user NAME]
+#         python -m maintenance archive [--user NAME] [--before YYYY-MM | --keep-months N]
+#         python -m maintenance unarchive [--user NAME] [--month YYYY-MM ...]
+#         python -m maintenance backfill-achievements [--user NAME]
+import argparse
+import csv
+import sys
+
+import db
+import rates
+
+def _users(args):
+    return [args.user] if args.user else db.list_users()
+
+def cmd_list_users(args):
+    for username in db.list_users():
+        print(username)
+    return 0
+
+def cmd_migrate(args):
+    for username in _users(args):
+        # get_schema_version goes through get_connection, which applies pending migrations
+        print(f"{username}: schema v{db.get_schema_version(username)}")
+    return 0
+
+def cmd_load_rates(args):
+    if args.paths:
+        count = sum(rates.load_csv(path) for path in args.paths)
+    else:
+        count = rates.load_directory()
+    print(f"loaded {count} rate(s); currencies: {', '.join(rates.currencies())}")
+    return 0
+
+def cmd_consolidate(args):
+    import consolidate
+    users = [args.user] if args.user else db.list_user_files()
+    stats = consolidate.consolidate(users, workers=args.workers)
+    print(f"copied {stats['users']} user(s), {stats['records']:,} record(s) "
+          f"into {db.SHARED_DB} in {stats['seconds']:.1f}s")
+    for username, error in sorted(stats["failed"].items()):
+        print(f"  {username}: FAILED {error}")
+    print("set EXPENSE_TRACKER_STORAGE=shared to serve from the shared store")
+    return 1 if stats["failed"] else 0
+
+def cmd_archive(args):
+    import archive
+    for username in _users(args):
+        moved = archive.archive_user(username, before=args.before, keep_months=args.keep_months)
+        print(f"{username}: archived {sum(moved.values()):,} record(s) from {len(moved)} month(s)")
+    return 0
+
+def cmd_unarchive(args):
+    import archive
+    for username in _users(args):
+        restored = archive.unarchive_user(username, months=args.month)
+        print(f"{username}: restored {sum(restored.values()):,} record(s) from {len(restored)} month(s)")
+    return 0
+
+def cmd_run_recurring(args):
+    import scheduler
+    created = scheduler.run_once(users=_users(args))
+    for username, n in sorted(created.items()):
+        print(f"{username}: {n} record(s)")
+    print(f"total: {sum(created.values())} record(s)")
+    return 0
+
+def cmd_export(args):
+    # CSV with importer.FIELDS plus each row's import_hash as the header, so
+    # `import` reads it back as is and skips the rows the user already has
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    try:
+        writer = csv.writer(out)
+        writer.writerow(["date", "category", "amount", "type", "description", "currency", "import_hash"])
+        count = 0
+        for row in db.export_records(args.user):
+            writer.writerow(row)
+            count += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"{args.user}: exported {count:,} record(s)", file=sys.stderr)
+    return 0
+
+def cmd_import(args):
+    import importer
+    fmt = args.format or ("ofx" if args.path.lower().endswith((".ofx", ".qfx")) else "csv")
+    with open(args.path, "rb") as f:
+        stats = importer.import_records(args.user, f, fmt=fmt, date_format=args.date_format)
+    print(f"{args.user}: {stats['inserted']:,} inserted, {stats['duplicates']:,} duplicate(s), "
+          f"{stats['skipped']:,} unreadable, {stats['rows_per_sec']:,.0f} rows/sec")
+    return 0
+
+def cmd_rebuild_aggregates(args):
+    for username in _users(args):
+        db.rebuild_aggregates(username)
+        print(f"{username}: rebuilt")
+    return 0
+
+def cmd_verify_aggregates(args):
+    status = 0
+    for username in _users(args):
+        drift = db.verify_aggregates(username)
+        if not drift:
+            print(f"{username}: ok")
+            continue
+        status = 1
+        print(f"{username}: {len(drift)} drifted bucket(s)")
+        for table, key, stored, expected in drift:
+            print(f"  {table} {key}: stored={stored} expected={expected}")
+        if args.fix:
+            db.rebuild_aggregates(username)
+            print(f"{username}: rebuilt")
+    return status
+
+def cmd_backfill_achievements(args):
+    total = 0
+    for username in _users(args):
+        unlocked = db.backfill_achievements(username)
+        total += len(unlocked)
+        print(f"{username}: {', '.join(unlocked) if unlocked else 'nothing new'}")
+    print(f"total: {total} achievement(s) unlocked")
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Expense Tracker maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("list-users", help="print every user in the configured storage layout")
+    p.set_defaults(func=cmd_list_users)
+
+    p = sub.add_parser("migrate", help="bring every user DB up to the current schema version")
+    p.add_argument("--user")
+    p.set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser("load-rates", help="load dated exchange rates from CSV (default: rates/*.csv)")
+    p.add_argument("paths", nargs="*")
+    p.set_defaults(func=cmd_load_rates)
+
+    p = sub.add_parser("consolidate", help="fold per-user DB files into the shared store")
+    p.add_argument("--user")
+    p.add_argument("--workers", type=int, default=4)
+    p.set_defaults(func=cmd_consolidate)
+
+    p = sub.add_parser("archive", help="move closed months of records to Arrow files")
+    p.add_argument("--user")
+    p.add_argument("--before", help="archive months before YYYY-MM")
+    p.add_argument("--keep-months", type=int, default=12, help="months kept in SQLite when --before is not given")
+    p.set_defaults(func=cmd_archive)
+
+    p = sub.add_parser("unarchive", help="move archived months back into SQLite")
+    p.add_argument("--user")
+    p.add_argument("--month", action="append", help="YYYY-MM (repeatable; default all)")
+    p.set_defaults(func=cmd_unarchive)
+
+    p = sub.add_parser("run-recurring", help="generate every due recurring transaction")
+    p.add_argument("--user")
+    p.set_defaults(func=cmd_run_recurring)
+
+    p = sub.add_parser("export", help="write a user's records (archived months included) as CSV")
+    p.add_argument("--user", required=True)
+    p.add_argument("--output", help="file to write (default stdout)")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("import", help="import a CSV export or bank statement; rows already present are skipped")
+    p.add_argument("--user", required=True)
+    p.add_argument("path")
+    p.add_argument("--format", choices=["csv", "ofx"], help="default: from the file extension")
+    p.add_argument("--date-format", help="strptime format when dates are ambiguous")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("rebuild-aggregates", help="recompute aggregate tables from records")
+    p.add_argument("--user")
+    p.set_defaults(func=cmd_rebuild_aggregates)
+
+    p = sub.add_parser("verify-aggregates", help="report aggregate drift against records")
+    p.add_argument("--user")
+    p.add_argument("--fix", action="store_true", help="rebuild users that drifted")
+    p.set_defaults(func=cmd_verify_aggregates)
+
+    p = sub.add_parser("backfill-achievements", help="evaluate every achievement rule against existing data")
+    p.add_argument("--user")
+    p.set_defaults(func=cmd_backfill_achievements)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
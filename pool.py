@@ -0,0 +1,165 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# -------------- Pooled SQLite Connections --------------
+# Connections are opened once per database file, configured with the pragmas
+# below, and kept in a bounded LRU. Callers keep the usual
+#     conn = pool.connect(path) ... conn.close()
+# shape: close() hands the connection back instead of closing the file.
+# Each connection is leased to one thread at a time (re-entrant for nested
+# calls on the same thread), which keeps Streamlit's rerun threads from
+# sharing a cursor mid-statement.
+# An optional observer (profiling.Profiler) is told about every open and may
+# supply a cursor factory; with none set, cursors are plain sqlite3 ones.
+
+DEFAULT_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("mmap_size", 64 * 1024 * 1024),
+    ("cache_size", -8000),  # KiB, i.e. ~8 MB page cache per connection
+    ("temp_store", "MEMORY"),
+)
+
+class PooledConnection(sqlite3.Connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lease = threading.RLock()
+        self._depth = 0
+        self._pool = None
+        self._path = None
+        self._closed = False
+        self.serial = 0
+
+    def close(self):
+        if self._pool is None:
+            super().close()
+        else:
+            self._pool.release(self)
+
+    def _cursor_factory(self):
+        observer = self._pool.observer if self._pool is not None else None
+        return observer.cursor_factory if observer is not None else None
+
+    def cursor(self, factory=None):
+        factory = factory or self._cursor_factory()
+        return super().cursor(factory) if factory else super().cursor()
+
+    def execute(self, sql, parameters=()):
+        # Connection.execute builds its cursor in C, bypassing cursor() above
+        if self._cursor_factory():
+            return self.cursor().execute(sql, parameters)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, parameters):
+        if self._cursor_factory():
+            return self.cursor().executemany(sql, parameters)
+        return super().executemany(sql, parameters)
+
+    def _close_for_real(self):
+        self._closed = True
+        sqlite3.Connection.close(self)
+
+
+class ConnectionPool:
+    def __init__(self, max_size=64, pragmas=DEFAULT_PRAGMAS, timeout=30.0):
+        self.max_size = max_size
+        self.pragmas = pragmas
+        self.timeout = timeout
+        self.observer = None
+        self._conns = OrderedDict()
+        self._lock = threading.Lock()
+        self.opens = 0
+        self.hits = 0
+        self.evictions = 0
+
+    def _open(self, path):
+        conn = sqlite3.connect(path, timeout=self.timeout, check_same_thread=False, factory=PooledConnection)
+        for name, value in self.pragmas:
+            conn.execute(f"PRAGMA {name}={value}")
+        conn._pool = self
+        conn._path = path
+        self.opens += 1
+        conn.serial = self.opens
+        if self.observer is not None:
+            self.observer.connection_opened(path)
+        return conn
+
+    def _evict(self, keep=None):
+        # Drop least recently used connections that nobody currently holds. `keep`
+        # is the one being handed out; when every other connection is in use the
+        # pool runs over max_size until some are released.
+        for key in list(self._conns):
+            if len(self._conns) <= self.max_size:
+                return
+            if key == keep:
+                continue
+            conn = self._conns[key]
+            if not conn._lease.acquire(blocking=False):
+                continue
+            if conn._depth > 0:
+                # The lease is re-entrant: this thread already holds it further up the stack
+                conn._lease.release()
+                continue
+            try:
+                del self._conns[key]
+                conn._close_for_real()
+                self.evictions += 1
+            finally:
+                conn._lease.release()
+
+    def connect(self, path, slot=0):
+        # slot lets several connections to one file coexist (the shared store
+        # spreads users across a few of them); everything else uses slot 0
+        key = (path, slot)
+        while True:
+            with self._lock:
+                conn = self._conns.get(key)
+                if conn is None:
+                    conn = self._open(path)
+                    self._conns[key] = conn
+                else:
+                    self.hits += 1
+                self._conns.move_to_end(key)
+                self._evict(keep=key)
+            conn._lease.acquire()
+            if conn._closed:
+                # Evicted between lookup and lease; try again
+                conn._lease.release()
+                continue
+            conn._depth += 1
+            return conn
+
+    def release(self, conn):
+        conn._depth -= 1
+        try:
+            if conn._depth == 0 and conn.in_transaction:
+                # Match plain close(): uncommitted work is discarded
+                conn.rollback()
+        finally:
+            conn._lease.release()
+
+    def close_all(self):
+        with self._lock:
+            conns = list(self._conns.values())
+            self._conns.clear()
+        for conn in conns:
+            with conn._lease:
+                conn._close_for_real()
+
+    def discard(self, path):
+        with self._lock:
+            conns = [self._conns.pop(key) for key in list(self._conns) if key[0] == path]
+        for conn in conns:
+            with conn._lease:
+                conn._close_for_real()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "open": len(self._conns),
+                "max_size": self.max_size,
+                "opens": self.opens,
+                "hits": self.hits,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,283 @@
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from lazy import LazyModule
+
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+
+# -------------- Hot-Path Instrumentation --------------
+# Opt-in: EXPENSE_TRACKER_PROFILE=1 or configure(enabled=True). While on, every
+# instrumented function call and every SQLite statement run inside a
+# profiling run (one Streamlit script run) is timed. At the end of the run the
+# per-function totals are appended as one JSON line to a rotating log.
+# While off, an instrumented call costs one attribute check and the pool uses
+# plain sqlite3 cursors.
+
+LOG_PATH = "data/profile.jsonl"
+MAX_BYTES = 5 * 1024 * 1024
+BACKUPS = 3
+MAX_SAMPLES = 200  # call durations kept per function per run, for percentiles
+SLOW_STATEMENTS = 5
+
+class ProfiledCursor(sqlite3.Cursor):
+    # Times execute/executemany and counts the rows fetched back
+    def execute(self, sql, parameters=()):
+        t0 = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            profiler.record_query(sql, time.perf_counter() - t0)
+
+    def executemany(self, sql, seq_of_parameters):
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            profiler.record_query(sql, time.perf_counter() - t0)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            profiler.record_rows(1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        profiler.record_rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        profiler.record_rows(len(rows))
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        profiler.record_rows(1)
+        return row
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = os.environ.get("EXPENSE_TRACKER_PROFILE", "").lower() in ("1", "true", "yes")
+        self.log_path = LOG_PATH
+        self._local = threading.local()
+        self._logger = None
+        self._lock = threading.Lock()
+
+    # -------------- Pool Observer --------------
+    @property
+    def cursor_factory(self):
+        return ProfiledCursor if self.enabled else None
+
+    def connection_opened(self, path):
+        run = self._run()
+        if run is not None:
+            run["connections_opened"] += 1
+
+    # -------------- Recording --------------
+    def _run(self):
+        return getattr(self._local, "run", None) if self.enabled else None
+
+    def wrap(self, name, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return func(*args, **kwargs)
+            run = getattr(self._local, "run", None)
+            if run is None:
+                return func(*args, **kwargs)
+            frame = {"name": name, "queries": 0, "rows": 0}
+            run["stack"].append(frame)
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - t0
+                run["stack"].pop()
+                stats = run["functions"].setdefault(name, {"calls": 0, "seconds": 0.0, "queries": 0, "rows": 0, "samples_ms": []})
+                stats["calls"] += 1
+                stats["seconds"] += elapsed
+                stats["queries"] += frame["queries"]
+                stats["rows"] += frame["rows"]
+                if len(stats["samples_ms"]) < MAX_SAMPLES:
+                    stats["samples_ms"].append(round(elapsed * 1000, 3))
+        wrapper.__wrapped__ = func
+        return wrapper
+
+    def instrument(self, namespace, exclude=()):
+        # Wrap every public function defined in the module owning `namespace`
+        module = namespace["__name__"]
+        for name, value in list(namespace.items()):
+            if (name.startswith("_") or name in exclude or not callable(value) or isinstance(value, type)
+                    or getattr(value, "__module__", None) != module):
+                continue
+            namespace[name] = self.wrap(f"{module}.{name}", value)
+
+    def record_query(self, sql, seconds):
+        run = self._run()
+        if run is None:
+            return
+        run["queries"] += 1
+        run["query_seconds"] += seconds
+        for frame in run["stack"]:
+            frame["queries"] += 1
+        slow = run["slow_statements"]
+        if len(slow) < SLOW_STATEMENTS or seconds > slow[-1][0]:
+            slow.append((seconds, " ".join(sql.split())[:300]))
+            slow.sort(key=lambda s: -s[0])
+            del slow[SLOW_STATEMENTS:]
+
+    def record_rows(self, n):
+        run = self._run()
+        if run is None:
+            return
+        run["rows"] += n
+        for frame in run["stack"]:
+            frame["rows"] += n
+
+    # -------------- Runs --------------
+    @contextmanager
+    def run(self, page=None, user=None):
+        # Yields the run dict (or None when disabled); callers may set run["page"]
+        if not self.enabled or getattr(self._local, "run", None) is not None:
+            yield None
+            return
+        run = {
+            "page": page, "user": user, "functions": {}, "stack": [],
+            "queries": 0, "query_seconds": 0.0, "rows": 0, "connections_opened": 0,
+            "slow_statements": [],
+        }
+        self._local.run = run
+        t0 = time.perf_counter()
+        try:
+            yield run
+        finally:
+            self._local.run = None
+            self._write(run, time.perf_counter() - t0)
+
+    def _write(self, run, seconds):
+        record = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "page": run["page"],
+            "user": run["user"],
+            "seconds": round(seconds, 6),
+            "queries": run["queries"],
+            "query_seconds": round(run["query_seconds"], 6),
+            "rows": run["rows"],
+            "connections_opened": run["connections_opened"],
+            "functions": run["functions"],
+            "slow_statements": [{"ms": round(s * 1000, 3), "sql": sql} for s, sql in run["slow_statements"]],
+        }
+        self._get_logger().info(json.dumps(record))
+
+    def _get_logger(self):
+        with self._lock:
+            if self._logger is None:
+                os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+                handler = logging.handlers.RotatingFileHandler(self.log_path, maxBytes=MAX_BYTES, backupCount=BACKUPS)
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                logger = logging.getLogger(f"expense_tracker.profile.{id(self)}")
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+                logger.addHandler(handler)
+                self._logger = logger
+            return self._logger
+
+    def configure(self, enabled=None, log_path=None):
+        if enabled is not None:
+            self.enabled = enabled
+        if log_path is not None and log_path != self.log_path:
+            with self._lock:
+                if self._logger is not None:
+                    for handler in list(self._logger.handlers):
+                        self._logger.removeHandler(handler)
+                        handler.close()
+                    self._logger = None
+                self.log_path = log_path
+
+
+profiler = Profiler()
+
+def load_runs(path=None, limit=2000):
+    # Most recent `limit` run records, oldest first, across the rotated files
+    path = path or profiler.log_path
+    files = [f"{path}.{i}" for i in range(BACKUPS, 0, -1)] + [path]
+    runs = []
+    for name in files:
+        if not os.path.exists(name):
+            continue
+        with open(name) as f:
+            for line in f:
+                try:
+                    runs.append(json.loads(line))
+                except ValueError:
+                    continue
+    return runs[-limit:]
+
+# -------------- Summaries (admin page) --------------
+def _percentiles(samples):
+    values = np.asarray(samples, dtype=np.float64)
+    if values.size == 0:
+        return np.nan, np.nan
+    p50, p95 = np.percentile(values, [50, 95])
+    return p50, p95
+
+def summarise_functions(runs):
+    # One row per function across runs, slowest total time first
+    totals = {}
+    for run in runs:
+        for name, stats in run.get("functions", {}).items():
+            entry = totals.setdefault(name, {"calls": 0, "seconds": 0.0, "queries": 0, "rows": 0, "samples": []})
+            entry["calls"] += stats["calls"]
+            entry["seconds"] += stats["seconds"]
+            entry["queries"] += stats["queries"]
+            entry["rows"] += stats["rows"]
+            entry["samples"].extend(stats["samples_ms"])
+    rows = []
+    for name, entry in totals.items():
+        p50, p95 = _percentiles(entry["samples"])
+        rows.append({
+            "function": name,
+            "calls": entry["calls"],
+            "total_ms": entry["seconds"] * 1000,
+            "mean_ms": entry["seconds"] * 1000 / entry["calls"],
+            "p50_ms": p50,
+            "p95_ms": p95,
+            "queries_per_call": entry["queries"] / entry["calls"],
+            "rows_per_call": entry["rows"] / entry["calls"],
+        })
+    columns = ["function", "calls", "total_ms", "mean_ms", "p50_ms", "p95_ms", "queries_per_call", "rows_per_call"]
+    df = pd.DataFrame(rows, columns=columns)
+    return df.sort_values("total_ms", ascending=False).set_index("function").round(3)
+
+def summarise_pages(runs):
+    # Queries, rows, connections and wall time per run, grouped by page
+    df = pd.DataFrame([
+        {"page": run.get("page") or "(none)", "queries": run["queries"], "rows": run["rows"],
+         "connections_opened": run["connections_opened"], "ms": run["seconds"] * 1000}
+        for run in runs
+    ], columns=["page", "queries", "rows", "connections_opened", "ms"])
+    if df.empty:
+        return df
+    grouped = df.groupby("page")
+    return pd.DataFrame({
+        "runs": grouped.size(),
+        "mean_queries": grouped["queries"].mean(),
+        "max_queries": grouped["queries"].max(),
+        "mean_rows": grouped["rows"].mean(),
+        "connections_opened": grouped["connections_opened"].sum(),
+        "p50_ms": grouped["ms"].median(),
+        "p95_ms": grouped["ms"].quantile(0.95),
+    }).sort_values("p95_ms", ascending=False).round(2)
+
+def call_samples(runs, function):
+    return np.array([ms for run in runs for ms in run.get("functions", {}).get(function, {}).get("samples_ms", [])])
@@ -0,0 +1,125 @@
+# Query-plan regression check for db.py.
+# Runs every public read/write function against a scratch user DB, captures the
+# SQL each one issues through the connection trace hook, and runs EXPLAIN QUERY
+# PLAN on it. A statement fails if its plan scans a whole table *and* sorts
+# through a temp B-tree, i.e. it is missing an index for its ORDER BY.
+# Usage:  python query_plans.py   (exit status 1 on regressions)
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+import db
+
+# Full recomputes read every row by design and are not on a page-render path.
+# Search scans and sorts only its materialised hits, at most db.SEARCH_WINDOW rows.
+ALLOWED = (
+    "INSERT INTO agg_totals (user_id, type, currency, day, amount, count)\n        SELECT",
+    "INSERT INTO agg_category (user_id, type, category, currency, day, amount, count)\n        SELECT",
+    "SUM(amount), COUNT(*)\n            FROM records\n            WHERE user_id = ",
+    "FROM hits h\n",
+)
+
+USER = "plancheck"
+
+def _seed(username):
+    db.add_record(username, "Food", 12.5, "Expense", "lunch", "USD")
+    db.add_record(username, "Salary", 1000, "Income", "pay", "INR")
+    start = (date.today() - timedelta(days=3)).isoformat()
+    db.add_recurring_transaction(username, "Rent", 500, "Expense", "rent", "monthly", start, "INR")
+    db.set_goal(username, 100)
+    db.log_goal_history(username, 120)
+    db.unlock_achievement(username, "First Goal Set")
+
+def _exercise(username):
+    db.get_records(username)
+    page = db.get_records(username, page_size=1)
+    db.get_records(username, page_size=50, cursor=db.records_cursor(page))
+    db.get_records(username, page_size=50, start_date="2024-01-01", end_date=date.today())
+    db.get_records(username, page_size=50, category="Food", record_type="Expense", currency="USD")
+    db.count_records(username)
+    db.count_records(username, record_type="Expense")
+    db.count_records(username, start_date="2024-01-01", category="Food")
+    db.search_records(username, "lunch")
+    list(db.export_records(username))
+    db.search_records(username, "rent", {"category": "Rent", "start_date": "2024-01-01"}, limit=10, offset=10)
+    db.process_due_recurring_transactions(username)
+    db.get_recurring_transactions(username)
+    db.get_goal(username)
+    db.get_goal_history(username)
+    db.get_streak(username)
+    db.get_best_streak(username)
+    db.get_streak_growth(username)
+    db.get_streak_stats(username)
+    db.get_goal_series(username)
+    db.get_goal_series(username, 100, "2024-01-01", "2024-12-31")
+    db.get_streak_series(username)
+    db.get_streak_series(username, 100, "2024-01-01")
+    db.log_goal_history(username, 130)
+    db.get_base_currency(username)
+    db.get_totals(username)
+    db.get_achievements(username)
+    db.unlock_achievement(username, "First Goal Set")
+    db.get_monthly_spending_by_category(username)
+    db.get_monthly_spending_by_category(username, months=12)
+    db.verify_aggregates(username)
+
+def _is_regression(plan):
+    details = [row[3] for row in plan]
+    full_scan = any(d.startswith("SCAN ") and "INDEX" not in d for d in details)
+    temp_sort = any("USE TEMP B-TREE FOR ORDER BY" in d for d in details)
+    return full_scan and temp_sort
+
+def collect_plans(storage="per_user"):
+    # Returns [(sql, plan_details, is_regression)] for every distinct statement
+    cwd = os.getcwd()
+    previous = db.STORAGE
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        db.configure_storage(storage)
+        try:
+            db.create_user_db(USER)
+            _seed(USER)
+            conn = db.get_connection(USER)
+            statements = []
+            conn.set_trace_callback(statements.append)
+            conn.close()
+            try:
+                _exercise(USER)
+            finally:
+                conn = db.get_connection(USER)
+                conn.set_trace_callback(None)
+                conn.close()
+
+            results, seen = [], set()
+            conn = db.get_connection(USER)
+            for sql in statements:
+                stripped = sql.strip()
+                if stripped in seen or not stripped.upper().startswith(("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")):
+                    continue
+                seen.add(stripped)
+                plan = conn.execute(f"EXPLAIN QUERY PLAN {stripped}").fetchall()
+                allowed = any(marker in stripped for marker in ALLOWED)
+                results.append((stripped, [row[3] for row in plan], _is_regression(plan) and not allowed))
+            conn.close()
+        finally:
+            db.configure_storage(previous)
+            os.chdir(cwd)
+    return results
+
+def main():
+    failures = 0
+    for storage in ("per_user", "shared"):
+        print(f"== {storage}")
+        for sql, details, bad in collect_plans(storage):
+            status = "FAIL" if bad else "ok  "
+            failures += bad
+            print(f"{status} {' '.join(sql.split())[:100]}")
+            if bad:
+                for d in details:
+                    print(f"       {d}")
+    print(f"{failures} regression(s)")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
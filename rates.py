@@ -0,0 +1,178 @@
+import csv
+import functools
+import glob
+import itertools
+import os
+import threading
+
+from lazy import LazyModule
+from pool import ConnectionPool
+
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+
+# -------------- Exchange Rates --------------
+# Dated rates live in data/rates.db as (date, currency, rate_to_reference),
+# loaded from the offline CSV files in rates/. Conversion is array based: for
+# each record the rate in force on its date is found with a sorted as-of
+# lookup (np.searchsorted), once per currency rather than once per row.
+# Dates before a currency's first rate use that first rate.
+
+REFERENCE = "INR"
+RATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rates")
+RATES_DB = "data/rates.db"
+
+_pool = ConnectionPool(max_size=4)
+_ready = False
+_ready_lock = threading.Lock()
+_loads = 0  # rate loads made by this process
+
+def _connect():
+    global _ready
+    if not _ready:
+        with _ready_lock:
+            if not _ready:
+                os.makedirs("data", exist_ok=True)
+                conn = _pool.connect(RATES_DB)
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS rates (
+                        date TEXT,
+                        currency TEXT,
+                        rate_to_reference REAL,
+                        PRIMARY KEY (currency, date)
+                    ) WITHOUT ROWID
+                """)
+                if conn.execute("SELECT 1 FROM rates LIMIT 1").fetchone() is None:
+                    # Seeded before _ready is set, so no other thread reads an empty table
+                    for path in _csv_files(RATES_DIR):
+                        _store(conn, _read_csv(path))
+                conn.commit()
+                conn.close()
+                _ready = True
+    return _pool.connect(RATES_DB)
+
+def _read_csv(path):
+    # CSV columns: date, currency, rate_to_reference
+    with open(path, newline="") as f:
+        return [
+            (row["date"].strip(), row["currency"].strip().upper(), float(row["rate_to_reference"]))
+            for row in csv.DictReader(f)
+        ]
+
+def _csv_files(directory):
+    return sorted(glob.glob(os.path.join(glob.escape(directory), "*.csv")))
+
+def _store(conn, rows):
+    conn.executemany("INSERT OR REPLACE INTO rates (date, currency, rate_to_reference) VALUES (?, ?, ?)", rows)
+
+def load_csv(path):
+    # Later loads overwrite the same (currency, date)
+    global _loads
+    rows = _read_csv(path)
+    conn = _connect()
+    _store(conn, rows)
+    conn.commit()
+    conn.close()
+    _loads += 1  # after the commit, so nothing caches the old rates under the new version
+    return len(rows)
+
+def load_directory(directory=RATES_DIR):
+    return sum(load_csv(path) for path in _csv_files(directory))
+
+def version():
+    # Changes whenever the rates change: loads made here, plus (via SQLite's
+    # data_version) loads committed by another process such as the maintenance
+    # CLI. The lookup caches below are keyed on it, and so is db's read cache.
+    conn = _connect()
+    external = conn.execute("PRAGMA data_version").fetchone()[0]
+    serial = conn.serial
+    conn.close()
+    return (_loads, serial, external)
+
+def currencies():
+    conn = _connect()
+    found = [r[0] for r in conn.execute("SELECT DISTINCT currency FROM rates ORDER BY currency")]
+    conn.close()
+    return found
+
+@functools.lru_cache(maxsize=16)
+def _rate_table(version, start_year, end_year):
+    # {currency: (dates datetime64[D], rates float64)} covering the given years,
+    # plus the nearest rate on either side so as-of lookups never fall off the edge
+    start, end = f"{start_year:04d}-01-01", f"{end_year:04d}-12-31"
+    conn = _connect()
+    rows = conn.execute("""
+        SELECT currency, date, rate_to_reference
+        FROM rates
+        WHERE date BETWEEN ? AND ?
+           OR date = (SELECT MAX(r.date) FROM rates r WHERE r.currency = rates.currency AND r.date < ?)
+           OR date = (SELECT MIN(r.date) FROM rates r WHERE r.currency = rates.currency)
+        ORDER BY currency, date
+    """, (start, end, start)).fetchall()
+    conn.close()
+    table = {}
+    for currency, group in itertools.groupby(rows, key=lambda r: r[0]):
+        group = list(group)
+        table[currency] = (
+            np.array([r[1] for r in group], dtype="datetime64[D]"),
+            np.array([r[2] for r in group], dtype=np.float64),
+        )
+    return table
+
+def changing_months(currencies, start, end):
+    # "YYYY-MM" months in [start, end] in which any of `currencies` gets a new
+    # rate after the 1st. In every other month one rate covers all its days.
+    return _changing_months(version(), currencies, start, end)
+
+@functools.lru_cache(maxsize=64)
+def _changing_months(version, currencies, start, end):
+    conn = _connect()
+    marks = ",".join("?" * len(currencies))
+    months = {r[0] for r in conn.execute(f"""
+        SELECT DISTINCT substr(date, 1, 7)
+        FROM rates
+        WHERE currency IN ({marks}) AND date BETWEEN ? AND ? AND substr(date, 9, 2) != '01'
+    """, (*currencies, start, end))}
+    conn.close()
+    return frozenset(months)
+
+def _asof(table, currency, days):
+    if currency not in table:
+        raise ValueError(f"No exchange rate for currency {currency!r}")
+    rate_dates, rate_values = table[currency]
+    idx = np.searchsorted(rate_dates, days, side="right") - 1
+    return rate_values[np.clip(idx, 0, None)]
+
+def _year(day):
+    return int(day.astype("datetime64[Y]").astype(np.int64)) + 1970
+
+def convert(amounts, from_currencies, dates, to_currency):
+    # Element-wise amounts[i] from from_currencies[i] into to_currency at the rate on dates[i]
+    amounts = np.asarray(amounts, dtype=np.float64)
+    days = np.asarray(dates, dtype="datetime64[D]")
+    if amounts.size == 0:
+        return amounts.copy()
+    table = _rate_table(version(), _year(days.min()), _year(days.max()))
+
+    # Hash-factorise once; per-currency masks are then integer compares
+    codes, uniques = pd.factorize(from_currencies)
+    factor = np.ones(amounts.size, dtype=np.float64)
+    to_rates = None
+    for code, currency in enumerate(uniques):
+        if currency == to_currency:
+            continue
+        mask = codes == code
+        if to_rates is None:
+            to_rates = _asof(table, to_currency, days)
+        factor[mask] = _asof(table, currency, days[mask]) / to_rates[mask]
+    return amounts * factor
+
+def cache_info():
+    return _rate_table.cache_info()
+
+def close():
+    global _ready
+    _pool.close_all()
+    _rate_table.cache_clear()
+    _changing_months.cache_clear()
+    _ready = False
@@ -0,0 +1,75 @@
+import logging
+import threading
+import time
+from datetime import date
+
+import db
+
+# -------------- Recurring Transaction Scheduler --------------
+# Generates due recurring records for every user DB, outside the page-render
+# path. Run it from cron (python scheduler.py) or let the app start the
+# background thread once per process with start_background().
+
+log = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 15 * 60  # seconds
+
+_thread = None
+_stop = threading.Event()
+_lock = threading.Lock()
+
+def run_once(today=None, users=None):
+    # Returns {username: records_created} for users that had something due
+    today = today or date.today()
+    created = {}
+    for username in users or db.list_users():
+        try:
+            n = db.process_due_recurring_transactions(username, today=today)
+        except Exception:
+            log.exception("recurring processing failed for %s", username)
+            continue
+        if n:
+            created[username] = n
+    return created
+
+def _loop(interval):
+    while not _stop.is_set():
+        started = time.perf_counter()
+        created = run_once()
+        log.info("recurring: %d records for %d users in %.2fs",
+                 sum(created.values()), len(created), time.perf_counter() - started)
+        _stop.wait(interval)
+
+def start_background(interval=DEFAULT_INTERVAL):
+    # Idempotent: Streamlit reruns the app script constantly
+    global _thread
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return _thread
+        _stop.clear()
+        _thread = threading.Thread(target=_loop, args=(interval,), name="recurring-scheduler", daemon=True)
+        _thread.start()
+        return _thread
+
+def stop_background():
+    _stop.set()
+    if _thread is not None:
+        _thread.join()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate due recurring transactions for all users")
+    parser.add_argument("--user", help="only process this user")
+    parser.add_argument("--loop", action="store_true", help="keep running every --interval seconds")
+    parser.add_argument("--interval", type=int, default=DEFAULT_INTERVAL)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    if args.loop:
+        start_background(args.interval).join()
+    else:
+        created = run_once(users=[args.user] if args.user else None)
+        for username, n in sorted(created.items()):
+            print(f"{username}: {n} record(s)")
+        print(f"total: {sum(created.values())} record(s)")
@@ -0,0 +1,74 @@
+# Cold-start budget check for the headless entry points.
+# Starts a fresh interpreter for each case below (best of --runs), times it
+# end to end, and lists which heavy modules it ended up importing. A case
+# fails if it runs over its budget or imports a module it must not.
+# Usage:  python startup_check.py [--runs 5] [--scale 1.0]   (exit status 1 on failure)
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HEAVY = ("streamlit", "pandas", "numpy", "pyarrow")
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+PROBE = """
+import sys
+{body}
+print("\\n" + __import__("json").dumps([m for m in {heavy!r} if m in sys.modules]))
+"""
+
+# Run once in the scratch directory first: one user with a record and a due
+# expense rule, so the cases below open an existing, migrated database
+SETUP = """
+import datetime, db
+db.add_record("startup", "Food", 12.5, "Expense", "lunch", "INR")
+start = (datetime.date.today() - datetime.timedelta(days=3)).isoformat()
+db.add_recurring_transaction("startup", "Rent", 500, "Expense", "rent", "daily", start, "INR")
+"""
+
+# (name, code run in the child, budget in seconds, modules it must not import)
+CASES = [
+    ("import core modules", "import db, Auth, rates, scheduler, maintenance", 0.35, HEAVY),
+    ("maintenance list-users", "import maintenance; maintenance.main(['list-users'])", 0.5, HEAVY),
+    ("maintenance run-recurring", "import maintenance; maintenance.main(['run-recurring'])", 0.5, HEAVY),
+    ("Auth.verify_user (unknown user)",
+     "import Auth; Auth.configure_hashing('pbkdf2_sha256', {'iterations': 1}); Auth.verify_user('nobody', 'x')",
+     0.35, HEAVY),
+]
+
+def run_case(code, cwd):
+    env = dict(os.environ, PYTHONPATH=REPO + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", PROBE.format(body=code, heavy=HEAVY)], cwd=cwd, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return time.perf_counter() - t0, json.loads(out.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every budget (slow machines)")
+    args = parser.parse_args()
+
+    # Bare interpreter start, so the numbers below can be read against it
+    baseline = min(run_case("pass", REPO)[0] for _ in range(args.runs))
+    print(f"python startup: {baseline * 1000:.0f} ms")
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        run_case(SETUP, tmp)
+        for name, code, budget, forbidden in CASES:
+            runs = [run_case(code, tmp) for _ in range(args.runs)]
+            best = min(seconds for seconds, _ in runs)
+            imported = sorted({m for _, loaded in runs for m in loaded})
+            banned = [m for m in imported if m in forbidden]
+            ok = best <= budget * args.scale and not banned
+            failures += not ok
+            note = f"  imported {', '.join(banned)}" if banned else ""
+            print(f"{'ok  ' if ok else 'FAIL'} {name:34s} {best * 1000:6.0f} ms (budget {budget * args.scale * 1000:.0f} ms){note}")
+    print(f"{failures} failure(s)")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())